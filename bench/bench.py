@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+
+#+-----------------------------------------------------------------------+
+#|                  Copyright (C) 2017 George Z. Zachos                  |
+#+-----------------------------------------------------------------------+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+# Benchmarks for the CiScal Compiler. Every benchmark but 'code' generates
+# its own (large) CiScal input, so no input files are required. The compiler
+# module is loaded from a path (--csc), so that the same benchmark can be
+# run against an older revision of csc.py (one that provides the Compiler
+# class), e.g.:
+#   git show HEAD~1:csc.py > /tmp/csc_old.py
+#   ./bench/bench.py --csc /tmp/csc_old.py lex
+
+
+import sys, os, time, argparse, importlib.util, tracemalloc
+
+tests_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    'tests')
+
+
+##############################################################
+#                                                            #
+#                  CiScal input generators                   #
+#                                                            #
+##############################################################
+
+
+# Generate a CiScal program with 'n' statements of mixed kinds.
+def gen_program(n):
+    lines = ['\\* generated by bench.py *\\', 'program bench {',
+        '\tdeclare', '\t\ta, b, c, d, i', '\tenddeclare', '']
+    stmts = [
+        'a := (b + c) * 2 - d / 3',
+        'if (a < b and not [c = d]) b := b + 1; else c := c - 1;',
+        'while (i <= 10) { i := i + 1; d := d + i }',
+        'print(a + b)',
+        '\\* a comment: if while ; := *\\ c := -a',
+    ]
+    for i in range(n):
+        lines.append('\t' + stmts[i % len(stmts)] + ';')
+    lines.append('\ta := 0')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+# Generate a CiScal program with 'n' if statements. No temporary
+# variables are needed, so the symbol table stays small.
+def gen_conditionals(n):
+    lines = ['program conds {', '\tdeclare', '\t\ta, b', '\tenddeclare', '']
+    for i in range(n):
+        lines.append('\tif (a < %d or b = a) b := %d; else a := b;;'
+            % (i % 32768, i % 32768))
+    lines.append('\tprint(b)')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+# Generate a CiScal program with a procedure that has 'n' parameters
+# and 'n' local variables, each of which is referenced.
+def gen_locals(n):
+    mainvars = ', '.join('v%d' % i for i in range(n))
+    params   = ', '.join('in p%d' % i for i in range(n))
+    locals   = ', '.join('l%d' % i for i in range(n))
+    lines = ['program locals {', '\tdeclare', '\t\t' + mainvars, '\tenddeclare',
+        '\tprocedure p(' + params + ') {', '\t\tdeclare', '\t\t\t' + locals,
+        '\t\tenddeclare']
+    for i in range(n):
+        lines.append('\t\tl%d := p%d + l%d;' % (i, i, (i * 7) % n))
+    lines.append('\t\tprint(l0)')
+    lines.append('\t}')
+    lines.append('\tcall p(' + ', '.join('in v%d' % i for i in range(n)) + ')')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+# Generate a CiScal program with procedures nested 'depth' levels deep;
+# the innermost one has 'n' statements referencing variables of every
+# enclosing level.
+def gen_nested(n, depth=8):
+    lines = ['program nested {']
+    for d in range(depth):
+        lines.append('\t' * d + 'declare x%d, y%d enddeclare' % (d, d))
+        lines.append('\t' * d + 'procedure p%d(inout r%d) {' % (d, d))
+    for i in range(n):
+        a, b = i % depth, (i * 3) % depth
+        lines.append('\t' * depth + 'x%d := y%d + r%d * x%d;' % (a, b, a, b))
+    lines.append('\t' * depth + 'print(x0)')
+    for d in reversed(range(depth)):
+        lines.append('\t' * d + '}')
+        lines.append('\t' * d + 'call p%d(inout y%d)' % (d, d))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+##############################################################
+#                                                            #
+#                        Benchmarks                          #
+#                                                            #
+##############################################################
+
+
+# Compile 'src' 'repeat' times at optimization level 'optlevel' and
+# return the best compile time along with the Compiler object of the
+# last run.
+def time_compile(csc, src, repeat, optlevel=0):
+    best = None
+    for run in range(repeat):
+        if optlevel > 0:
+            compiler = csc.Compiler(src, optlevel=optlevel)
+        else:
+            compiler = csc.Compiler(src)
+        start = time.perf_counter()
+        compiler.run()
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return best, compiler
+
+
+# Lex the whole input and report tokens per second.
+def bench_lex(csc, args):
+    src  = gen_program(args.size)
+    best = None
+    for run in range(args.repeat):
+        compiler = csc.Compiler(src, lexer=args.lexer)
+        ntokens = 0
+        start = time.perf_counter()
+        while compiler.lex().tktype != csc.TokenType.EOF:
+            ntokens += 1
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    print('lex (%s): %d lines, %d tokens, %.3f s, %.0f tokens/s' %
+        (args.lexer, src.count('\n'), ntokens, best, ntokens / best))
+
+
+# Compile programs of increasing size and report the compile time
+# of each one, along with its ratio to the previous size.
+def bench_scale(csc, args):
+    prev = None
+    for n in [int(size) for size in args.sizes.split(',')]:
+        best, compiler = time_compile(csc, gen_conditionals(n), args.repeat,
+            args.optlevel)
+        ratio = '' if prev == None else ' (x%.1f)' % (best / prev)
+        print('scale: %7d conditionals, %6d quads, %8.3f s%s' %
+            (n, len(compiler.quad_code), best, ratio))
+        prev = best
+
+
+# Compile programs with 'size' parameters and local variables in a
+# single subprogram and report the compile time.
+def bench_symtab(csc, args):
+    for n in [int(size) for size in args.sizes.split(',')]:
+        best, compiler = time_compile(csc, gen_locals(n), args.repeat, args.optlevel)
+        print('symtab: %6d parameters and locals, %8.3f s' % (n, best))
+
+
+# Compile a program with deeply nested subprograms and many
+# variable references and report the compile time.
+def bench_nested(csc, args):
+    best, compiler = time_compile(csc, gen_nested(args.size), args.repeat,
+        args.optlevel)
+    print('nested: %d statements, %d quads, %.3f s' %
+        (args.size, len(compiler.quad_code), best))
+
+
+# Compile a large program under tracemalloc and report the peak
+# memory, along with the memory still held once compilation is over
+# (mostly the intermediate code in quad_code).
+def bench_memory(csc, args):
+    src = gen_program(args.size)
+    tracemalloc.start()
+    compiler = csc.Compiler(src)
+    compiler.run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nquads = len(compiler.quad_code)
+    print('memory: %d statements, %d quads, peak %.1f MiB, retained %.1f MiB'
+        ' (%.0f bytes/quad)' % (args.size, nquads, peak / 2**20,
+        current / 2**20, current / nquads))
+
+
+# Return the number of instructions, loads and stores in MIPS assembly
+# code 'asm'. Labels, directives and comments are not counted.
+def count_instrs(asm):
+    ninstrs = nloads = nstores = 0
+    for line in asm.split('\n'):
+        fields = line.split('#', 1)[0].split()
+        if not fields or fields[0].endswith(':') or fields[0].startswith('.'):
+            continue
+        ninstrs += 1
+        if fields[0] == 'lw':
+            nloads += 1
+        elif fields[0] == 'sw':
+            nstores += 1
+    return ninstrs, nloads, nstores
+
+
+# Compile every CiScal program under 'dir' (except the ones expected to
+# fail) at each optimization level of 'levels' and report the number of
+# emitted instructions, loads and stores. These are static counts: the
+# programs are not run. Programs that fail to compile are skipped.
+def bench_code(csc, args):
+    levels = [int(level) for level in args.levels.split(',')]
+    totals = dict((level, [0, 0, 0]) for level in levels)
+    for dirpath, dirnames, filenames in os.walk(args.dir):
+        dirnames[:] = sorted(d for d in dirnames if d != 'assert-fail')
+        for filename in sorted(filenames):
+            if not filename.endswith('.csc'):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path) as f:
+                src = f.read()
+            name = os.path.relpath(path, args.dir)
+            try:
+                counts = dict()
+                for level in levels:
+                    if level > 0:
+                        compiler = csc.Compiler(src, path, optlevel=level)
+                    else:
+                        compiler = csc.Compiler(src, path)
+                    counts[level] = count_instrs(compiler.run().asm)
+            except csc.CompileError:
+                print('code: %-36s compilation failed, skipped' % name)
+                continue
+            for level in levels:
+                for i in range(3):
+                    totals[level][i] += counts[level][i]
+            print('code: %-36s %s' % (name,
+                '  '.join('%5d/%4d/%4d' % counts[level] for level in levels)))
+    print('code: %-36s %s' % ('total (instructions/lw/sw per level)',
+        '  '.join('%5d/%4d/%4d' % tuple(totals[level]) for level in levels)))
+
+
+##############################################################
+#                                                            #
+#                          Main                              #
+#                                                            #
+##############################################################
+
+
+# Import csc.py (or an older revision of it) from 'path'.
+def load_csc(path):
+    spec = importlib.util.spec_from_file_location('csc', path)
+    csc  = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(csc)
+    return csc
+
+
+def main(argv):
+    default_csc = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir, 'csc.py')
+    argp = argparse.ArgumentParser(description='CiScal Compiler benchmarks')
+    argp.add_argument('--csc', default=default_csc,
+        help='path of the csc.py module to benchmark')
+    argp.add_argument('-n', '--size', type=int, default=100000,
+        help='number of generated statements')
+    argp.add_argument('-r', '--repeat', type=int, default=3,
+        help='number of runs; the best one is reported')
+    argp.add_argument('--lexer', choices=['fsm', 'table'], default='fsm',
+        help='lexical analyzer engine')
+    argp.add_argument('-O', dest='optlevel', type=int, default=0,
+        help='optimization level of the compile benchmarks')
+    argp.add_argument('--sizes', default='1000,10000,100000',
+        help='comma separated input sizes of the scale and symtab benchmarks')
+    argp.add_argument('--levels', default='0,1,2',
+        help='comma separated optimization levels of the code benchmark')
+    argp.add_argument('--dir', default=tests_dir,
+        help='directory of the CiScal programs of the code benchmark')
+    argp.add_argument('benchmark', choices=['lex', 'scale', 'symtab', 'nested',
+        'memory', 'code'])
+    args = argp.parse_args(argv)
+
+    benchmarks = {'lex': bench_lex, 'scale': bench_scale, 'symtab': bench_symtab,
+        'nested': bench_nested, 'memory': bench_memory, 'code': bench_code}
+    benchmarks[args.benchmark](load_csc(args.csc), args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -21,7 +21,8 @@
 # Email: gzzachos_at_gmail.com
 
 
-import sys, getopt, os
+import sys, getopt, os, re, bisect, io, hashlib, json, socket, signal, stat, threading
+import time, traceback, concurrent.futures, functools
 from enum import Enum
 from collections import OrderedDict
 
@@ -111,15 +112,63 @@ class Token():
             + '\', ' + str(self.tkl) + ', ' + str(self.tkc) + ')'
 
 
+# Final (assembly) code under construction. It is kept in memory as
+# separate sections, which are joined only once code generation is over.
+#   prologue : code executed first (jump to the main program), filled in
+#              when the main program is translated into final code
+#   text     : lines of the text section
+#   data     : lines of the data section
+class AsmSections():
+    def __init__(self):
+        self.prologue = ''
+        self.text, self.data = list(), list()
+        self.emit = self.text.append      # Append a line to the text
+        self.emit_data = self.data.append # or to the data section.
+
+    # Return the final code.
+    def getvalue(self):
+        if self.data:
+            data = '\n###########################\n\n    .data\n\n' + ''.join(self.data)
+        else:
+            data = ''
+        return self.prologue + ''.join(self.text) + data
+
+
+# A line of the text section, as the peephole optimizer sees it (see
+# Compiler.optimize_asm()).
+#   op   : instruction mnemonic, or None for a label or a blank line
+#   args : list of operands, or [label name] for a label ('' if blank)
+#   line : the text line itself; a new instruction gets a formatted one
+class Instr():
+    __slots__ = ('op', 'args', 'line')
+
+    def __init__(self, op, args, line=None):
+        self.op, self.args = op, args
+        if line == None:
+            line = '    %-7s %s\n' % (op, ', '.join(args))
+        self.line = line
+
+
+
 # The rest of the classes consist the data model required for
 # the implementation of the intermediate code generation and
 # the symbol table.
 
 
+# Quads make up most of the memory used during compilation, so they
+# have no per-instance __dict__. Their operator and operand strings are
+# interned by the lexical analyzer and shared among all quads.
 class Quad():
-    def __init__(self, label, op, arg1, arg2, res):
+    __slots__ = ('label', 'op', 'arg1', 'arg2', 'res',
+                 'arg1_bind', 'arg2_bind', 'res_bind')
+
+    def __init__(self, label, op, arg1, arg2, res,
+            arg1_bind=None, arg2_bind=None, res_bind=None):
         self.label, self.op, self.arg1, self.arg2 = label, op, arg1, arg2
         self.res = res
+        # Binding objects of identifier operands (see bind_operand()).
+        self.arg1_bind, self.arg2_bind = arg1_bind, arg2_bind
+        self.res_bind = res_bind
 
     def __str__(self):
         return '(' + str(self.label) + ': ' + str(self.op)+ ', ' + \
@@ -130,14 +179,34 @@ class Quad():
             str(self.arg1) + ', ' + str(self.arg2) + ', ' + str(self.res) + ')'
 
 
+# 'entities' keeps the declaration order (printing relies on it), while
+# 'index' maps an entity name to a dictionary of the entities with that
+# name, keyed by entity type, so that lookups need not scan 'entities'.
 class Scope():
     def __init__(self, nested_level=0, enclosing_scope=None):
         self.entities, self.nested_level = list(), nested_level
         self.enclosing_scope = enclosing_scope
+        self.index = dict()
+        self.bindings = dict() # (name, etype) -> Binding; see bind_operand()
         self.tmp_offset = 12
+        self.link_reach = 0    # see Compiler.find_frame_uses()
 
     def addEntity(self, entity):
         self.entities.append(entity)
+        # Keep the first entity of each name and type, just like a
+        # linear search of 'entities' would find.
+        self.index.setdefault(entity.name, dict()).setdefault(entity.etype, entity)
+
+    # Return the entity named 'name' of type 'etype' or, if 'etype' is
+    # None, the first declared entity named 'name'. Return None if there
+    # is no such entity in this scope.
+    def lookup(self, name, etype=None):
+        kinds = self.index.get(name)
+        if kinds == None:
+            return None
+        if etype == None:
+            return next(iter(kinds.values()))
+        return kinds.get(etype)
 
     def get_offset(self):
         retval = self.tmp_offset
@@ -185,6 +254,7 @@ class Function(Entity):
         super().__init__(name, "FUNCTION")
         self.ret_type, self.start_quad = ret_type, start_quad
         self.args, self.framelength = list(), -1
+        self.uses_access_link = True # see Compiler.find_frame_uses()
 
     def add_arg(self, arg):
         self.args.append(arg)
@@ -220,32 +290,181 @@ class TmpVar(Entity):
         return super().__str__() + ', offset: ' + str(self.offset)
 
 
+# What an identifier operand of a quad resolves to in the scope the quad
+# was generated in (see bind_operand()). Final code generation only
+# needs bindings, so it never searches the symbol table.
+# The offset and parameter mode are read through 'entity', since
+# allocate_temp_slots() may change the offsets of temporary variables.
+#   entity : Entity object
+#   etype  : entity type
+#   level  : nested level of the scope the entity belongs to
+#   depth  : nested level of the referencing scope minus 'level'
+class Binding():
+    __slots__ = ('entity', 'etype', 'level', 'depth')
+
+    def __init__(self, entity, level, depth):
+        self.entity, self.etype, self.level = entity, entity.etype, level
+        self.depth = depth
+
+    def __str__(self):
+        return self.etype + ': ' + self.entity.name + ', level: ' + \
+            str(self.level) + ', depth: ' + str(self.depth)
+
+
+# A basic block: a maximal sequence of quads that is only entered at
+# its first quad and only left after its last one.
+#   index : position of the block in FlowGraph.blocks
+#   quads : list of Quad objects
+#   succs : list of successor BasicBlock objects
+#   preds : list of predecessor BasicBlock objects
+class BasicBlock():
+    __slots__ = ('index', 'quads', 'succs', 'preds')
+
+    def __init__(self, index, quads):
+        self.index, self.quads = index, quads
+        self.succs, self.preds = list(), list()
+
+    def __str__(self):
+        return 'B' + str(self.index) + ': L_' + str(self.quads[0].label) + \
+            ' - L_' + str(self.quads[-1].label)
+
+
+# The control flow graph of 'quads', the quads of a single block (from
+# begin_block to end_block). A basic block starts at the first quad, at
+# every jump target and after every jump, conditional jump, retv and
+# halt quad. Blocks are kept in quad order, so 'blocks[0]' is the entry.
+#   quads    : list of Quad objects
+#   blocks   : list of BasicBlock objects
+#   block_of : dictionary mapping the label of the first quad of a
+#              basic block to the block
+class FlowGraph():
+    def __init__(self, quads):
+        self.quads = quads
+        first, last = quads[0].label, quads[-1].label
+        leaders = {first}
+        for quad in quads:
+            if quad.op == 'jump' or quad.op in relops:
+                if first <= quad.res <= last:
+                    leaders.add(quad.res)
+                leaders.add(quad.label + 1)
+            elif quad.op in ('retv', 'halt'):
+                leaders.add(quad.label + 1)
+        leaders = sorted(label for label in leaders if label <= last)
+        self.blocks   = list()
+        self.block_of = dict()
+        for start, end in zip(leaders, leaders[1:] + [last + 1]):
+            block = BasicBlock(len(self.blocks), quads[start - first:end - first])
+            self.blocks.append(block)
+            self.block_of[start] = block
+        for block in self.blocks:
+            quad = block.quads[-1]
+            targets = list()
+            if quad.op == 'jump' or quad.op in relops:
+                targets.append(quad.res)
+            if quad.op != 'jump' and quad.op not in ('retv', 'halt', 'end_block'):
+                targets.append(quad.label + 1)
+            for label in targets:
+                succ = self.block_of.get(label)
+                if succ != None and succ not in block.succs:
+                    block.succs.append(succ)
+                    succ.preds.append(block)
+
+    # Return the set of the indices of the blocks reachable from the entry.
+    def reachable(self):
+        reached  = {0}
+        worklist = [self.blocks[0]]
+        while worklist:
+            for succ in worklist.pop().succs:
+                if succ.index not in reached:
+                    reached.add(succ.index)
+                    worklist.append(succ)
+        return reached
+
+    # Solve a dataflow problem with the iterative worklist algorithm.
+    # Values are bit vectors (ints), one bit per variable, definition
+    # etc. 'forward' is the direction of the problem, 'gen' and 'kill'
+    # are lists of bit vectors (index: block index) and 'boundary' is the
+    # value that flows into the entry block (forward problems) or out of
+    # the blocks with no successors (backward problems). The meet
+    # operator is union, as needed by liveness and reaching definitions.
+    # Return an (ins, outs) tuple of lists of bit vectors: the values at
+    # the entry and at the exit of every block.
+    def solve(self, forward, gen, kill, boundary):
+        before = [0] * len(self.blocks) # ins (forward) or outs
+        after  = [0] * len(self.blocks) # outs (forward) or ins
+        if forward:
+            worklist = list(reversed(self.blocks))
+        else:
+            worklist = list(self.blocks)
+        pending = set(range(len(self.blocks)))
+        while worklist:
+            block = worklist.pop()
+            pending.discard(block.index)
+            if forward:
+                sources, targets = block.preds, block.succs
+                value = boundary if block.index == 0 else 0
+            else:
+                sources, targets = block.succs, block.preds
+                value = boundary if not block.succs else 0
+            for source in sources:
+                value |= after[source.index]
+            before[block.index] = value
+            value = gen[block.index] | (value & ~kill[block.index])
+            if value != after[block.index]:
+                after[block.index] = value
+                for target in targets:
+                    if target.index not in pending:
+                        pending.add(target.index)
+                        worklist.append(target)
+        if forward:
+            return before, after
+        return after, before
+
+
 ##############################################################
 #                                                            #
 #         Global data declarations and definitions           #
 #                                                            #
 ##############################################################
 
-lineno   = charno = -1  # Current line and character number of input file.
-token    = Token(None, None, None, None)
-# in_function, in_dowhile, exit_dowhile and have_return are array
-# structures and each element corresponds to a nested level in case
-# of curly-braced blocks and not function/procedure blocks.
-in_function  = []    # currently inside a function (not procedure).
-in_dowhile   = []    # currently inside a do-while statement.
-exit_dowhile = []    # used to implement exit for a do-while statement.
-have_return  = []    # have return statement at specific nested level.
-have_subprog = False # True if nested functions are defined in user program.
-nextlabel    = 0
-tmpvars      = dict() # A dictionary holding temporary variable names
-                      # used in intermediate code generation.
-next_tmpvar  = 1      # Used to implement the naming convention of
-                      # temporary variables.
-quad_code    = list() # The main program equivalent in quadruples.
-scopes       = list() # The list of currently 'active' scopes.
-actual_pars  = list() # holds subprogram params as discovered
-                      # while traversing intermediate code
-main_programs_framelength = halt_label = -1
+# The state of a single compilation lives in a Compiler object;
+# only read-only data is kept global, so that compilations can
+# take place concurrently.
+
+# The artifacts a compilation can produce: final code, intermediate
+# code, its ANSI C equivalent and the control flow graphs of the
+# intermediate code in DOT format (.asm, .int, .c and .dot files),
+# along with the ones produced by default.
+artifact_kinds = ('asm', 'int', 'c', 'dot')
+default_emit   = ('asm', 'int', 'c')
+
+# Optimization levels (see Compiler.optimize_block()).
+optlevels = (0, 1, 2)
+
+# Registers that the register allocator (see Compiler.allocate_registers())
+# keeps variables in: calls may overwrite the caller-saved ones, while a
+# subprogram restores the callee-saved ones it uses before it returns.
+caller_saved_regs = ('$t3', '$t4', '$t5', '$t6', '$t7', '$t8')
+callee_saved_regs = ('$s1', '$s2', '$s3', '$s4', '$s5', '$s6', '$s7')
+
+# Integer range of CiScal.
+min_int, max_int = -32768, 32767
+
+# Relational and arithmetic operators of intermediate code.
+relops   = ('=', '<>', '<', '<=', '>', '>=')
+arithops = ('+', '-', '*', '/')
+
+# The relational operator of the negated condition of every relational
+# operator.
+negated_relops = {'=': '<>', '<>': '=', '<': '>=', '<=': '>', '>': '<=', '>=': '<'}
+
+# The relational operator of the same condition with swapped operands,
+# for every relational operator.
+swapped_relops = {'=': '=', '<>': '<>', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+# Range of the immediate operands of MIPS instructions.
+min_imm, max_imm = -32768, 32767
+
 tokens       = {
     '(':          TokenType.LPAREN,
     ')':          TokenType.RPAREN,
@@ -289,6 +508,21 @@ tokens       = {
     'default':    TokenType.DEFAULTSYM,
     'EOF':        TokenType.EOF}
 
+# Master regular expression of the table-driven lexical analyzer. A
+# 'word' is an identifier, a keyword or a number (see table_lex()). The
+# order of the alternatives matters: a comment that fails to match is
+# reported as 'unterm', a lone backslash as 'bslash'. The comment body
+# mirrors fsm_lex(): a '*' always consumes the character that follows.
+token_regex  = re.compile(r'''
+      (?P<ws>[^\S\n]+)
+    | (?P<nl>\n)
+    | (?P<word>[^\W_]+)
+    | (?P<oper><=|<>|>=|:=|[-+*/=,;:{}()\[\]<>])
+    | (?P<comment>\\\*[^*]*(?:\*[^\\][^*]*)*\*\\)
+    | (?P<unterm>\\\*)
+    | (?P<bslash>\\)
+    ''', re.VERBOSE)
+
 
 ##############################################################
 #                                                            #
@@ -297,1447 +531,3057 @@ tokens       = {
 ##############################################################
 
 
-# Print error message to stderr and exit.
+# Print error message to stderr (or 'file') and exit.
 def perror_exit(ec, *args, **kwargs):
-    print('[' + clr.ERR + 'ERROR' + clr.END + ']', *args, file=sys.stderr, **kwargs)
+    perror(*args, **kwargs)
     sys.exit(ec)
 
 
-# Print error message to stderr.
+# Print error message to stderr (or 'file').
 def perror(*args, **kwargs):
-    print('[' + clr.ERR + 'ERROR' + clr.END + ']', *args, file=sys.stderr, **kwargs)
+    kwargs.setdefault('file', sys.stderr)
+    print('[' + clr.ERR + 'ERROR' + clr.END + ']', *args, **kwargs)
 
 
-# Print warning to stderr.
+# Print warning to stderr (or 'file').
 def pwarn(*args, **kwargs):
-    print('[' + clr.WRN + 'WARNING' + clr.END + ']', *args, file=sys.stderr, **kwargs)
-
-
-# Print line #lineno to stderr with character charno highlighted.
-def perror_line(lineno, charno):
-    currchar = infile.tell()
-    infile.seek(0)
-    for index, line in enumerate(infile):
-        if index == lineno-1:
-            print(" ", line.replace('\t', ' ').replace('\n', ''), file=sys.stderr)
-            print(clr.GRN + " " * (charno + 1) + '^' + clr.END, file=sys.stderr)
-    infile.seek(currchar)
-
-
-# Print line #lineno to stderr with character charno
-# highlighted and along with and error message. Finally exit.
-def perror_line_exit(ec, lineno, charno, *args, **kwargs):
-    print('[' + clr.ERR + 'ERROR' + clr.END + ']', clr.BLD + '%s:%d:%d:' %
-        (infile.name, lineno, charno) + clr.END, *args, file=sys.stderr, **kwargs)
-    currchar = infile.tell()
-    infile.seek(0)
-    for index, line in enumerate(infile):
-        if index == lineno-1:
-            print(" ", line.replace('\t', ' ').replace('\n', ''), file=sys.stderr)
-            print(clr.GRN + " " * (charno + 1) + '^' + clr.END, file=sys.stderr)
-    close_files()
-    os.remove(int_file.name)
-    os.remove(ceq_file.name)
-    sys.exit(ec)
-
-
-# Open files.
-def open_files(input_filename, interm_filename, cequiv_filename, output_filename):
-    global infile, int_file, ceq_file, outfile, lineno, charno
-    lineno = 1
-    charno = 0
-    try:
-        infile   = open(input_filename,  'r', encoding='utf-8')
-        int_file = open(interm_filename, 'w', encoding='utf-8')
-        ceq_file = open(cequiv_filename, 'w', encoding='utf-8')
-        outfile  = open(output_filename, 'w', encoding='utf-8')
-    except OSError as oserr:
-        if oserr.filename != None:
-            perror_exit(oserr.errno, oserr.filename + ':', oserr.strerror)
-        else:
-            perror_exit(oserr.errno, oserr)
-
-
-# Close files.
-def close_files():
-    global infile
-    infile.close()
-    int_file.close()
-    ceq_file.close()
-    outfile.close()
+    kwargs.setdefault('file', sys.stderr)
+    print('[' + clr.WRN + 'WARNING' + clr.END + ']', *args, **kwargs)
 
 
 ##############################################################
 #                                                            #
-#           Lexical analyzer related functions               #
+#                     Compiler session                       #
 #                                                            #
 ##############################################################
 
 
-# Perform lexical analysis
-def lex():
-    global lineno, charno
-
-    buffer = []
-    tkl = tkc = -1 # token start lineno, charno
-    cc = cl = -1   # comment start lineno, charno
-    state = 0      # Initial FSM state
-    OK    = -2     # Final FSM state
-    unget = False  # True if file pointer should be repositioned
-
-    # Lexical analyzer's FSM implementation
-    while state != OK:
-        c = infile.read(1)
-        buffer.append(c)
-        charno += 1
-        if state == 0:
-            if c.isalpha():
-                state = 1
-            elif c.isdigit():
-                state = 2
-            elif c == '<':
-                state = 3
-            elif c == '>':
-                state = 4
-            elif c == ':':
-                state = 5
-            elif c == '\\':
-                state = 6
-            elif c in ('+', '-', '*', '/', '=', ',', ';', '{', '}', '(', ')', '[', ']'):
-                state = OK
-            elif c == '': # EOF
-                state = OK
-                return Token(TokenType.EOF, 'EOF', lineno, charno)
-            elif c.isspace():
-                state = 0
+# Raised when compilation fails.
+#   ec          : exit code of the command line interface
+#   diagnostics : warning and error messages issued so far
+class CompileError(Exception):
+    def __init__(self, ec, diagnostics):
+        super().__init__(diagnostics)
+        self.ec, self.diagnostics = ec, diagnostics
+
+
+# What a successful compilation produces. Artifacts that were not
+# requested (see Compiler) are None.
+#   interm      : intermediate code
+#   cequiv      : ANSI C equivalent of the intermediate code or None
+#                 if nested functions are defined in user program
+#   asm         : MIPS assembly code
+#   diagnostics : warning messages
+#   dot         : control flow graphs of the intermediate code (DOT)
+#   peephole    : dictionary of the hits of every peephole optimization
+#                 rule (see peephole_rules); empty below -O1
+class Artifacts():
+    def __init__(self, interm, cequiv, asm, diagnostics, dot=None, peephole=None):
+        self.interm, self.cequiv, self.asm = interm, cequiv, asm
+        self.diagnostics = diagnostics
+        self.dot = dot
+        self.peephole = peephole if peephole != None else dict()
+
+
+# A single compilation of CiScal program 'source'. 'filename' is only
+# used in diagnostics, 'lexer' selects the lexical analyzer engine
+# ('fsm' or 'table'), 'emit' the artifacts to produce (a subset of
+# artifact_kinds) and 'optlevel' the optimization level (see
+# optimize_block()). Final code is always generated, since its
+# generation performs semantic checks, but the intermediate code, C
+# equivalent and control flow graph files are only generated on
+# request. All the compilation state is kept here, so any number of
+# Compiler objects can be used, even by different threads.
+class Compiler():
+    def __init__(self, source, filename='<input>', lexer='fsm', emit=default_emit,
+            optlevel=0):
+        self.filename = filename
+        self.emit     = emit
+        self.optlevel = optlevel
+        self.lineno   = 1          # Current line and character number of input.
+        self.charno   = 0
+        self.source   = source
+        self.srclen   = len(source) # Length of source and lexical analyzer's cursor.
+        self.srcpos   = 0
+        self.line_offsets = [0]    # Start offset of each line in source
+                                   # (index: lineno-1), filled in by the
+                                   # lexical analyzer.
+        self.lexer    = lexer      # Lexical analyzer engine: 'fsm' or 'table'.
+        if lexer == 'table':       # Callable returning the next token.
+            self.lex_engine = self.table_lex().__next__
+        else:
+            self.lex_engine = self.fsm_lex
+        self.token    = Token(None, None, None, None)
+        # in_function, in_dowhile, exit_dowhile and have_return are array
+        # structures and each element corresponds to a nested level in case
+        # of curly-braced blocks and not function/procedure blocks.
+        self.in_function  = []    # currently inside a function (not procedure).
+        self.in_dowhile   = []    # currently inside a do-while statement.
+        self.exit_dowhile = []    # used to implement exit for a do-while statement.
+        self.have_return  = []    # have return statement at specific nested level.
+        self.have_subprog = False # True if nested functions are defined in user program.
+        self.nextlabel    = 0
+        self.tmpvars      = dict() # A dictionary holding temporary variable names
+                                   # used in intermediate code generation.
+        self.next_tmpvar  = 1      # Used to implement the naming convention of
+                                   # temporary variables.
+        self.quad_code    = list() # The main program equivalent in quadruples.
+        self.scopes       = list() # The list of currently 'active' scopes.
+        self.actual_pars  = list() # holds subprogram params as discovered
+                                   # while traversing intermediate code
+        self.nonlocal_entities = set() # Entities referred to by nested scopes.
+        self.regs         = dict() # Registers of the variables of the block
+        self.saved_regs   = list() # that is translated into final code, see
+        self.entry_loads  = list() # allocate_registers().
+        self.frame_slots  = dict() # Cached frame addresses of the enclosing
+                                   # blocks, see cache_frame_addrs().
+        self.leaf         = False  # True if the block makes no calls, see
+                                   # find_frame_uses().
+        self.main_programs_framelength = self.halt_label = -1
+        self.mainprog_name = None
+        # Output buffers (None if not requested)
+        self.int_file = io.StringIO() if 'int' in emit else None
+        self.ceq_file = io.StringIO() if 'c' in emit else None
+        self.dot_file = io.StringIO() if 'dot' in emit else None
+        self.asm      = AsmSections()
+        self.errfile  = io.StringIO()
+        self.peephole_hits = dict() # Hits of every peephole optimization rule.
+
+    # Compile the program and return an Artifacts object.
+    # Raise CompileError on failure.
+    def run(self):
+        self.parser()
+        interm = cequiv = asm = dot = None
+        if self.int_file != None:
+            interm = self.int_file.getvalue()
+        if self.ceq_file != None:
+            cequiv = self.ceq_file.getvalue()
+        if 'asm' in self.emit:
+            if self.optlevel >= 1:
+                self.optimize_asm()
+            asm = self.asm.getvalue()
+        if self.dot_file != None:
+            dot = 'digraph "%s" {\n    node [shape=box, fontname="monospace"];\n' \
+                '%s}\n' % (self.mainprog_name, self.dot_file.getvalue())
+        return Artifacts(interm, cequiv, asm, self.errfile.getvalue(), dot,
+            self.peephole_hits)
+
+
+    ##############################################################
+    #                                                            #
+    #         Useful error/warning reporting functions           #
+    #                                                            #
+    ##############################################################
+
+
+    # Report error message and abort compilation.
+    def perror_exit(self, ec, *args, **kwargs):
+        print('[' + clr.ERR + 'ERROR' + clr.END + ']', *args, file=self.errfile, **kwargs)
+        raise CompileError(ec, self.errfile.getvalue())
+
+
+    # Report warning.
+    def pwarn(self, *args, **kwargs):
+        print('[' + clr.WRN + 'WARNING' + clr.END + ']', *args, file=self.errfile, **kwargs)
+
+
+    # Report line #lineno with character charno highlighted.
+    def perror_line(self, lineno, charno):
+        line = self.get_line(lineno)
+        if line != None:
+            print(" ", line.replace('\t', ' '), file=self.errfile)
+            print(clr.GRN + " " * (charno + 1) + '^' + clr.END, file=self.errfile)
+
+
+    # Report line #lineno with character charno highlighted
+    # along with an error message and abort compilation.
+    def perror_line_exit(self, ec, lineno, charno, *args, **kwargs):
+        print('[' + clr.ERR + 'ERROR' + clr.END + ']', clr.BLD + '%s:%d:%d:' %
+            (self.filename, lineno, charno) + clr.END, *args, file=self.errfile, **kwargs)
+        self.perror_line(lineno, charno)
+        raise CompileError(ec, self.errfile.getvalue())
+
+
+    ##############################################################
+    #                                                            #
+    #           Lexical analyzer related functions               #
+    #                                                            #
+    ##############################################################
+
+
+    # Return the next token of the selected lexical analyzer engine.
+    def lex(self):
+        return self.lex_engine()
+
+
+    # Perform lexical analysis (hand-written FSM engine).
+    def fsm_lex(self):
+        tkstart = -1   # token start offset in source
+        tkl = tkc = -1 # token start lineno, charno
+        cc = cl = -1   # comment start lineno, charno
+        state = 0      # Initial FSM state
+        OK    = -2     # Final FSM state
+        unget = False  # True if cursor should be moved back
+        source, srclen, line_offsets = self.source, self.srclen, self.line_offsets
+        srcpos, lineno, charno = self.srcpos, self.lineno, self.charno
+
+        # Lexical analyzer's FSM implementation
+        while state != OK:
+            if srcpos < srclen:
+                c = source[srcpos]
             else:
-                perror_line_exit(2, lineno, charno, 'Invalid character \'%c\' in program' % c)
-        elif state == 1:
-            if not c.isalnum():
-                unget = True
-                state = OK
-        elif state == 2:
-            if not c.isdigit():
+                c = '' # EOF
+            srcpos += 1
+            charno += 1
+            if state == 0:
+                tkstart = srcpos - 1
+                tkl, tkc = lineno, charno
                 if c.isalpha():
-                    perror_line_exit(2, lineno, charno - len(''.join(buffer)) + 1,
-                        'Variable names should begin with alphabetic character')
-                unget = True
+                    state = 1
+                elif c.isdigit():
+                    state = 2
+                elif c == '<':
+                    state = 3
+                elif c == '>':
+                    state = 4
+                elif c == ':':
+                    state = 5
+                elif c == '\\':
+                    state = 6
+                elif c in ('+', '-', '*', '/', '=', ',', ';', '{', '}', '(', ')', '[', ']'):
+                    state = OK
+                elif c == '': # EOF
+                    state = OK
+                    self.srcpos, self.lineno, self.charno = srcpos, lineno, charno
+                    return Token(TokenType.EOF, 'EOF', lineno, charno)
+                elif c.isspace():
+                    state = 0
+                else:
+                    self.perror_line_exit(2, lineno, charno, 'Invalid character \'%c\' in program' % c)
+            elif state == 1:
+                if not c.isalnum():
+                    unget = True
+                    state = OK
+            elif state == 2:
+                if not c.isdigit():
+                    if c.isalpha():
+                        self.perror_line_exit(2, tkl, tkc,
+                            'Variable names should begin with alphabetic character')
+                    unget = True
+                    state = OK
+            elif state == 3:
+                if c != '=' and c != '>':
+                    unget = True
                 state = OK
-        elif state == 3:
-            if c != '=' and c != '>':
-                unget = True
-            state = OK
-        elif state == 4:
-            if c != '=':
-                unget = True
-            state = OK
-        elif state == 5:
-            if c != '=':
-                unget = True
-            state = OK
-        elif state == 6:
-            if c == '*':
-                state = 7
-                cl = lineno
-                cc = charno - 1
-            else:
-                perror_line_exit(2, lineno, charno, 'Expected \'*\' after \'\\\'')
-        elif state == 7:
-            if c == '': # EOF
-                perror_line_exit(2, cl, cc, 'Unterminated comment')
-            elif c == '*':
-                state = 8
-        elif state == 8:
-            if c == '\\':
-                del buffer[:]
-                state = 0
-            else:
-                state = 7
-        if state == OK:
-            tkl = lineno
-            tkc = charno - len(''.join(buffer)) + 1
-        if c.isspace():
-            del buffer[-1]
-            unget = False
-            if c == '\n':
-                lineno += 1
-                charno = 0
-
-    # Unget last character read
-    if unget == True:
-        del buffer[-1]
-        if c != '': # EOF (special case)
-            infile.seek(infile.tell() - 1)
-        charno -= 1
-
-    # Empty buffer and return the Token object
-    buff_cont = ''.join(buffer)
-    if buff_cont not in tokens.keys():
-        if buff_cont.isdigit():
-            retval = Token(TokenType.NUMBER, buff_cont, tkl, tkc)
+            elif state == 4:
+                if c != '=':
+                    unget = True
+                state = OK
+            elif state == 5:
+                if c != '=':
+                    unget = True
+                state = OK
+            elif state == 6:
+                if c == '*':
+                    state = 7
+                    cl = lineno
+                    cc = charno - 1
+                else:
+                    self.perror_line_exit(2, lineno, charno, 'Expected \'*\' after \'\\\'')
+            elif state == 7:
+                if c == '': # EOF
+                    self.perror_line_exit(2, cl, cc, 'Unterminated comment')
+                elif c == '*':
+                    state = 8
+            elif state == 8:
+                if c == '\\':
+                    state = 0
+                else:
+                    state = 7
+            if c.isspace():
+                unget = False
+                if c == '\n':
+                    lineno += 1
+                    charno = 0
+                    if lineno > len(line_offsets):
+                        line_offsets.append(srcpos)
+
+        # The last character read does not belong to the token if it is
+        # whitespace (consumed) or a lookahead character (unget).
+        tkend = srcpos
+        if unget == True or c.isspace():
+            tkend -= 1
+        if unget == True:
+            srcpos  -= 1
+            charno  -= 1
+        self.srcpos, self.lineno, self.charno = srcpos, lineno, charno
+
+        # Return the Token object
+        tkval  = sys.intern(source[tkstart:tkend])
+        tktype = tokens.get(tkval)
+        if tktype == None:
+            if tkval.isdigit():
+                return Token(TokenType.NUMBER, tkval, tkl, tkc)
+            return Token(TokenType.IDENT, sys.intern(tkval[:30]), tkl, tkc)
+        return Token(tktype, tkval, tkl, tkc)
+
+
+    # Perform lexical analysis (table-driven engine). Tokens are matched
+    # by the precompiled 'token_regex' and yielded lazily. Once the end of
+    # input is reached, EOF tokens are yielded for ever, just like fsm_lex().
+    def table_lex(self):
+        lineno, linestart, pos = 1, 0, 0 # linestart: offset of current line
+        match = token_regex.match
+        while True:
+            m = match(self.source, pos)
+            if m == None:
+                if pos < self.srclen:
+                    self.perror_line_exit(2, lineno, pos - linestart + 1,
+                        'Invalid character \'%c\' in program' % self.source[pos])
+                while True:
+                    yield Token(TokenType.EOF, 'EOF', lineno, pos - linestart + 1)
+            kind, end = m.lastgroup, m.end()
+            if kind == 'ws':
+                pass
+            elif kind == 'nl':
+                lineno   += 1
+                linestart = end
+                if lineno > len(self.line_offsets):
+                    self.line_offsets.append(end)
+            elif kind == 'word':
+                tkval = sys.intern(m.group())
+                if tkval[0].isalpha():
+                    yield Token(tokens.get(tkval, TokenType.IDENT),
+                        sys.intern(tkval[:30]), lineno, pos - linestart + 1)
+                elif tkval[0].isdigit():
+                    if not tkval.isdigit():
+                        end = pos + 1
+                        while self.source[end].isdigit():
+                            end += 1
+                        if self.source[end].isalpha():
+                            self.perror_line_exit(2, lineno, pos - linestart + 1,
+                                'Variable names should begin with alphabetic character')
+                        tkval = self.source[pos:end]
+                    yield Token(TokenType.NUMBER, tkval, lineno, pos - linestart + 1)
+                else:
+                    self.perror_line_exit(2, lineno, pos - linestart + 1,
+                        'Invalid character \'%c\' in program' % tkval[0])
+            elif kind == 'oper':
+                tkval = sys.intern(m.group())
+                yield Token(tokens[tkval], tkval, lineno, pos - linestart + 1)
+            elif kind == 'comment':
+                nl = self.source.find('\n', pos, end)
+                while nl != -1:
+                    lineno   += 1
+                    linestart = nl + 1
+                    if lineno > len(self.line_offsets):
+                        self.line_offsets.append(linestart)
+                    nl = self.source.find('\n', linestart, end)
+            elif kind == 'unterm':
+                self.perror_line_exit(2, lineno, pos - linestart + 1, 'Unterminated comment')
+            else: # bslash
+                self.perror_line_exit(2, lineno, pos - linestart + 2,
+                    'Expected \'*\' after \'\\\'')
+            pos = end
+
+
+    # Extend line_offsets (normally filled in by the lexical analyzer)
+    # until it covers source offset 'offset' or line #lineno.
+    def index_lines(self, offset=-1, lineno=-1):
+        while self.line_offsets[-1] <= offset or len(self.line_offsets) < lineno:
+            nl = self.source.find('\n', self.line_offsets[-1])
+            if nl == -1:
+                return
+            self.line_offsets.append(nl + 1)
+
+
+    # Return line #lineno of source without the trailing newline
+    # or None if there is no such line.
+    def get_line(self, lineno):
+        self.index_lines(lineno=lineno + 1)
+        if lineno < 1 or lineno > len(self.line_offsets) \
+                or self.line_offsets[lineno-1] >= self.srclen:
+            return None
+        start = self.line_offsets[lineno-1]
+        if lineno < len(self.line_offsets):
+            return self.source[start:self.line_offsets[lineno]-1]
+        return self.source[start:]
+
+
+    # Map source offset 'offset' to a (lineno, charno) pair; charno is
+    # 1-based, just like the one of tokens.
+    def offset_to_linecol(self, offset):
+        self.index_lines(offset=offset)
+        index = bisect.bisect_right(self.line_offsets, offset) - 1
+        return index + 1, offset - self.line_offsets[index] + 1
+
+
+    ##############################################################
+    #                                                            #
+    #           Intermediate code related functions              #
+    #                                                            #
+    ##############################################################
+
+
+    def next_quad(self):
+        return self.nextlabel
+
+
+    # Identifier operands are resolved right away into Binding objects.
+    def gen_quad(self, op=None, arg1='_', arg2='_', res='_'):
+        label = self.nextlabel
+        self.nextlabel += 1
+        newquad  = Quad(label, op, arg1, arg2, res)
+        if op in ('begin_block', 'end_block', 'call'):
+            newquad.arg1_bind = self.bind_operand(arg1, "FUNCTION")
+        elif op == 'par':
+            newquad.arg1_bind = self.bind_operand(arg1)
+        elif op not in ('jump', 'halt'):
+            newquad.arg1_bind = self.bind_operand(arg1)
+            newquad.arg2_bind = self.bind_operand(arg2)
+            newquad.res_bind  = self.bind_operand(res)
+        self.quad_code.append(newquad)
+
+
+    def new_temp(self):
+        key = 'T_'+str(self.next_tmpvar)
+        self.tmpvars[key] = None
+        offset = self.scopes[-1].get_offset()
+        self.scopes[-1].addEntity(TmpVar(key, offset))
+        self.next_tmpvar += 1
+        return key
+
+
+    def empty_list(self):
+        return list()
+
+
+    def make_list(self, label):
+        newlist = list()
+        newlist.append(label)
+        return newlist
+
+
+    def merge(self, list1, list2):
+        return list1 + list2
+
+
+    # Labels are assigned densely by gen_quad(), so the quad
+    # labeled 'label' is always quad_code[label].
+    def backpatch(self, somelist, res):
+        for label in somelist:
+            self.quad_code[label].res = res
+
+
+    # Generate a file containing the intermediate code
+    # of the user program.
+    def generate_int_code_file(self):
+        for quad in self.quad_code:
+            self.int_file.write(quad.tofile() + '\n')
+
+
+    # A naive way to find which variables should be declared.
+    def find_var_decl(self, quad):
+        vars = dict()
+        index = self.quad_code.index(quad) + 1
+        while True:
+            q = self.quad_code[index]
+            if q.op == 'end_block':
+                break
+            if q.arg2 not in ('CV', 'REF', 'RET') and q.op != 'call':
+                if isinstance(q.arg1, str):
+                    vars[q.arg1] = 'int'
+                if isinstance(q.arg2, str):
+                    vars[q.arg2] = 'int'
+                if isinstance(q.res, str):
+                    vars[q.res] = 'int'
+            index += 1
+        if '_' in vars:
+            del vars['_']
+        return OrderedDict(sorted(vars.items()))
+
+
+    # Transform variable declarations to ANSI C equivalent.
+    def transform_decls(self, vars):
+        flag = False
+        retval = '\n\tint '
+        for var in vars:
+            flag = True
+            retval += var + ', '
+        if flag == True:
+            return retval[:-2] + ';'
         else:
-            retval = Token(TokenType.IDENT, buff_cont[:30], tkl, tkc)
-    else:
-        retval = Token(tokens[buff_cont], buff_cont, tkl, tkc)
-    del buffer[:]
-    return retval
+            return ''
+
+
+    # Transform a quad to ANSI C code.
+    def transform_to_c(self, quad):
+        addlabel = True
+        if quad.op == 'jump':
+            retval = 'goto L_' + str(quad.res) + ';'
+        elif quad.op in ('=', '<>', '<', '<=', '>', '>='):
+            op = quad.op
+            if op == '=':
+                op = '=='
+            elif op == '<>':
+                op = '!='
+            retval = 'if (' + str(quad.arg1) + ' ' + op + ' ' + \
+                str(quad.arg2) + ') goto L_' + str(quad.res) + ';'
+        elif quad.op == ':=':
+            retval = quad.res + ' = ' + str(quad.arg1) + ';'
+        elif quad.op in ('+', '-', '*', '/'):
+            retval = quad.res + ' = ' + str(quad.arg1) + ' ' + \
+                str(quad.op) + ' ' + str(quad.arg2) + ';'
+        elif quad.op == 'out':
+            retval = 'printf("%d\\n", ' + str(quad.arg1) + ');'
+        elif quad.op == 'retv':
+            retval = 'return (' + str(quad.arg1) + ');'
+        elif quad.op == 'begin_block':
+            addlabel = False
+            if quad.arg1 == self.mainprog_name:
+                retval = 'int main(void)\n{'
+            else: # Should never reach else.
+                retval = 'int ' + quad.arg1 + '()\n{'
+            vars = self.find_var_decl(quad)
+            retval += self.transform_decls(vars)
+            retval += '\n\tL_' + str(quad.label) + ':'
+        elif quad.op == 'call':
+            # Should never reach this line.
+            retval = quad.arg1 + '();'
+        elif quad.op == 'end_block':
+            addlabel = False
+            retval = '\tL_' + str(quad.label) + ': {}\n'
+            retval += '}\n'
+        elif quad.op == 'halt':
+            retval = 'return 0;' # change to exit() if arbitrary
+                                 # halt statements are enabled
+                                 # at a later time.
+        else:
+            return None
+        if addlabel == True:
+            retval = '\tL_' + str(quad.label) + ': ' + retval
+        return retval
 
 
-##############################################################
-#                                                            #
-#           Intermediate code related functions              #
-#                                                            #
-##############################################################
+    # Generate a file containing the ANSI C equivalent code
+    # of intermediate code. This file is ready to compile.
+    def generate_c_code_file(self):
+        self.ceq_file.write('#include <stdio.h>\n\n')
+        self.ceq_file.write('/* This file was automatically generated by:\n')
+        self.ceq_file.write(' *     CiScal Compiler ' + __version__ + '\n')
+        self.ceq_file.write(' */\n\n')
+        for quad in self.quad_code:
+            tmp = self.transform_to_c(quad)
+            if tmp != None:
+                self.ceq_file.write(tmp + '\n')
+
+
+    ##############################################################
+    #                                                            #
+    #          Control flow and data flow analysis               #
+    #                                                            #
+    ##############################################################
+
+
+    # Return the (escaping, nontemps) tuple of sets of the names of the
+    # variables the quads of control flow graph 'cfg' refer to: the ones
+    # that may be aliased (see unaliased()) and the ones that are not
+    # temporary variables.
+    def flow_names(self, cfg):
+        escaping, nontemps = set(), set()
+        for quad in cfg.quads:
+            for name, b in ((quad.arg1, quad.arg1_bind), (quad.arg2, quad.arg2_bind),
+                    (quad.res, quad.res_bind)):
+                if b != None and b.etype in ('VARIABLE', 'PARAMETER'):
+                    nontemps.add(name)
+                    if not self.unaliased(b):
+                        escaping.add(name)
+        return escaping, nontemps
+
+
+    # Return the (uses, defs, maydefs) tuple of sets of the names of the
+    # variables quad 'quad' may read, always writes and may write (see
+    # flow_names() for 'escaping' and 'nontemps'). Names that may be
+    # aliased are assumed to share their memory location, so reading one
+    # of them reads all of them and writing one of them may write all of
+    # them. A subprogram may read or write any variable visible to it, so
+    # a call reads and may write every variable but the temporary ones.
+    def uses_defs(self, quad, escaping, nontemps):
+        uses, defs, maydefs = set(), set(), set()
+        op = quad.op
+        if op in arithops or op in relops:
+            operands = (quad.arg1, quad.arg2)
+        elif op in (':=', 'out', 'retv') or (op == 'par' and quad.arg2 != 'RET'):
+            operands = (quad.arg1,)
+        else:
+            operands = ()
+        for name in operands:
+            if name in nontemps or name in self.tmpvars:
+                uses.add(name)
+        if uses & escaping:
+            uses |= escaping
+        if op in arithops or op == ':=':
+            defs.add(quad.res)
+            if quad.res in escaping:
+                maydefs |= escaping
+        elif op == 'par' and quad.arg2 == 'RET':
+            defs.add(quad.arg1)
+        elif op == 'par' and quad.arg2 == 'REF':
+            maydefs |= uses
+        elif op == 'call':
+            uses |= nontemps
+            maydefs |= nontemps
+        maydefs -= defs
+        return uses, defs, maydefs
+
+
+    # Return the bit vector (see FlowGraph.solve()) of set 'keys', given
+    # the bit of every key in dictionary 'bit_of'. Keys missing from
+    # 'bit_of' are added to it.
+    def bit_vector(self, bit_of, keys):
+        vector = 0
+        for key in keys:
+            vector |= 1 << bit_of.setdefault(key, len(bit_of))
+        return vector
+
+
+    # Return the set of the keys of bit vector 'vector', given the key of
+    # every bit in list 'keys'.
+    def bit_set(self, vector, keys):
+        result = set()
+        while vector:
+            low = vector & -vector
+            result.add(keys[low.bit_length() - 1])
+            vector ^= low
+        return result
+
+
+    # Live variable analysis of control flow graph 'cfg'. Return a
+    # (names, ins, outs) tuple: the list of the names of the variables
+    # (index: bit) and the lists of bit vectors (see FlowGraph.solve(),
+    # index: block index) of the variables live at the entry and at the
+    # exit of every basic block. Variables that may be aliased are live
+    # on exit, since they outlive the block. 'escaping' and 'nontemps'
+    # are computed by flow_names(), unless given.
+    def liveness(self, cfg, escaping=None, nontemps=None):
+        if escaping == None:
+            escaping, nontemps = self.flow_names(cfg)
+        bit_of = dict() # Bit of every variable name.
+        gen, kill = list(), list()
+        for block in cfg.blocks:
+            uses = defs = 0
+            for quad in reversed(block.quads):
+                quad_uses, quad_defs, quad_maydefs = \
+                    self.uses_defs(quad, escaping, nontemps)
+                quad_defs = self.bit_vector(bit_of, quad_defs)
+                uses = (uses & ~quad_defs) | self.bit_vector(bit_of, quad_uses)
+                defs |= quad_defs
+            gen.append(uses)
+            kill.append(defs)
+        ins, outs = cfg.solve(False, gen, kill, self.bit_vector(bit_of, escaping))
+        return sorted(bit_of, key=bit_of.get), ins, outs
+
+
+    # Reaching definitions analysis of control flow graph 'cfg'. A
+    # definition is a (label, name) tuple: quad 'label' writes or may
+    # write variable 'name'. Only definitions that always write their
+    # variable kill the other definitions of it. Definitions are many,
+    # so the sets are returned as bit vectors (see FlowGraph.solve()).
+    # Return a (definitions, ins, outs) tuple: the list of definitions
+    # (index: bit) and the lists of bit vectors (index: block index) of
+    # the definitions reaching the entry and the exit of every block.
+    def reaching_definitions(self, cfg):
+        escaping, nontemps = self.flow_names(cfg)
+        definitions = list()
+        quad_defs   = dict() # (defs, bit vector of definitions) of every quad.
+        name_defs   = dict() # Bit vector of the definitions of every name.
+        for quad in cfg.quads:
+            uses, defs, maydefs = self.uses_defs(quad, escaping, nontemps)
+            vector = 0
+            for name in defs | maydefs:
+                bit = 1 << len(definitions)
+                definitions.append((quad.label, name))
+                name_defs[name] = name_defs.get(name, 0) | bit
+                vector |= bit
+            quad_defs[quad.label] = (defs, vector)
+        gen, kill = list(), list()
+        for block in cfg.blocks:
+            block_gen = block_kill = 0
+            for quad in block.quads:
+                defs, vector = quad_defs[quad.label]
+                for name in defs:
+                    block_gen  &= ~name_defs[name]
+                    block_kill |= name_defs[name]
+                block_gen |= vector
+            gen.append(block_gen)
+            kill.append(block_kill)
+        ins, outs = cfg.solve(True, gen, kill, 0)
+        return definitions, ins, outs
+
+
+    # Append the control flow graph of the block 'name' that starts at
+    # quad 'block_start_quad' to the DOT file, as a cluster subgraph. A
+    # node is a basic block, named after its first quad and labeled with
+    # its quads and the variables live at its exit.
+    def generate_dot_subgraph(self, name, block_start_quad):
+        cfg = FlowGraph(self.quad_code[block_start_quad:])
+        names, live_in, live_out = self.liveness(cfg)
+        self.dot_file.write('    subgraph "cluster_%s" {\n' % name)
+        self.dot_file.write('        label="%s";\n' % name)
+        for block in cfg.blocks:
+            lines = [quad.tofile() for quad in block.quads]
+            live = self.bit_set(live_out[block.index], names)
+            lines.append('live: ' + ', '.join(sorted(live)))
+            self.dot_file.write('        L_%d [label="%s\\l"];\n' %
+                (block.quads[0].label, '\\l'.join(lines)))
+        for block in cfg.blocks:
+            for succ in block.succs:
+                self.dot_file.write('        L_%d -> L_%d;\n' %
+                    (block.quads[0].label, succ.quads[0].label))
+        self.dot_file.write('    }\n')
+
+
+    ##############################################################
+    #                                                            #
+    #           Intermediate code optimization passes            #
+    #                                                            #
+    ##############################################################
+
+
+    # Optimize the quads of the block starting at quad 'block_start_quad'
+    # (the last block in quad_code) before it is translated into final
+    # code. The passes depend on the optimization level:
+    #   0 : none
+    #   1 : constant folding and propagation, local common subexpression
+    #       elimination, copy propagation, jump optimizations, dead code
+    #       elimination, temporary variable slot reuse, caching of the
+    #       frame addresses of enclosing blocks, lighter calls of leaf
+    #       subprograms and of ones that do not use their access link
+    #   2 : the above, along with register allocation
+    def optimize_block(self, block_start_quad):
+        self.regs, self.saved_regs, self.entry_loads = dict(), list(), list()
+        self.frame_slots, self.leaf = dict(), False
+        if self.optlevel >= 1:
+            self.fold_constants(block_start_quad)
+            self.number_values(block_start_quad)
+            self.propagate_copies(block_start_quad)
+            self.optimize_jumps(block_start_quad)
+            self.eliminate_dead_code(block_start_quad)
+            self.allocate_temp_slots(block_start_quad)
+            self.cache_frame_addrs(block_start_quad)
+            self.find_frame_uses(block_start_quad)
+        if self.optlevel >= 2:
+            self.allocate_registers(block_start_quad)
+
+
+    # True if variable binding 'b' names a memory location that no other
+    # name can refer to within straight-line code: a temporary variable,
+    # or a local variable or 'in' parameter of the current block. Global
+    # and non-local variables and 'inout' parameters may be aliased (e.g.
+    # a global variable passed by reference), so nothing is assumed
+    # about their values.
+    def unaliased(self, b):
+        if b == None:
+            return False
+        if b.etype == 'TMPVAR':
+            return True
+        return b.depth == 0 and (b.etype == 'VARIABLE' or \
+            (b.etype == 'PARAMETER' and b.entity.par_mode == 'in'))
+
+
+    # Return the value of 'op' applied to constants 'x' and 'y', or None
+    # if it cannot be computed at compile time: division by zero, or a
+    # result outside the CiScal integer range, which is left to run time.
+    # Division truncates towards zero, like MIPS div.
+    def fold_arith(self, op, x, y):
+        if op == '+':
+            value = x + y
+        elif op == '-':
+            value = x - y
+        elif op == '*':
+            value = x * y
+        elif y == 0:
+            return None
+        else:
+            value = abs(x) // abs(y)
+            if (x < 0) != (y < 0):
+                value = -value
+        if value < min_int or value > max_int:
+            return None
+        return value
 
 
-def next_quad():
-    return nextlabel
+    # Return the truth value of relational operator 'op' applied to
+    # constants 'x' and 'y'.
+    def fold_relop(self, op, x, y):
+        if op == '=':
+            return x == y
+        elif op == '<>':
+            return x != y
+        elif op == '<':
+            return x < y
+        elif op == '<=':
+            return x <= y
+        elif op == '>':
+            return x > y
+        return x >= y
+
+
+    # Constant folding and propagation over the quads of the block that
+    # starts at quad 'block_start_quad'. 'consts' maps the names of the
+    # unaliased variables (see unaliased()) known to hold a constant to
+    # that constant. Knowledge flows along extended basic blocks: a basic
+    # block starts with what was known at the exit of its predecessor,
+    # if it has a single one that precedes it, and with nothing
+    # otherwise. A call may change any variable visible to the callee,
+    # so it drops everything but temporary variables. Parameter quads are
+    # left unchanged, since the checks of subprogram arguments refer to
+    # their operands by name. Folded arithmetic quads become assignments;
+    # folded conditional jumps become jumps, either to their target or
+    # to the next quad, so labels and jump targets are left unchanged.
+    def fold_constants(self, block_start_quad):
+        cfg = FlowGraph(self.quad_code[block_start_quad:])
+        exit_consts = list() # Constants at the exit of every basic block.
+        for block in cfg.blocks:
+            pred = block.preds[0] if len(block.preds) == 1 else None
+            if pred != None and pred.index < block.index:
+                consts = dict(exit_consts[pred.index])
+            else:
+                consts = dict()
+            exit_consts.append(consts)
+            for quad in block.quads:
+                self.fold_quad(quad, consts)
 
 
-def gen_quad(op=None, arg1='_', arg2='_', res='_'):
-    global nextlabel
-    label = nextlabel
-    nextlabel += 1
-    newquad  = Quad(label, op, arg1, arg2, res)
-    quad_code.append(newquad)
+    # Fold quad 'quad' (see fold_constants()), given the constants of
+    # 'consts', which is updated with the values the quad assigns.
+    def fold_quad(self, quad, consts):
+        op = quad.op
+        if op in arithops or op in relops or op in (':=', 'out', 'retv'):
+            if quad.arg1 in consts:
+                quad.arg1, quad.arg1_bind = consts[quad.arg1], None
+            if quad.arg2 in consts:
+                quad.arg2, quad.arg2_bind = consts[quad.arg2], None
+        if op in arithops:
+            value = None
+            if isinstance(quad.arg1, int) and isinstance(quad.arg2, int):
+                value = self.fold_arith(op, quad.arg1, quad.arg2)
+            if value != None:
+                quad.op, quad.arg1, quad.arg2 = ':=', value, '_'
+                quad.arg1_bind = quad.arg2_bind = None
+                op = ':='
+            elif quad.res in consts:
+                del consts[quad.res]
+        if op == ':=':
+            if isinstance(quad.arg1, int) and self.unaliased(quad.res_bind):
+                consts[quad.res] = quad.arg1
+            elif quad.res in consts:
+                del consts[quad.res]
+        elif op in relops:
+            if isinstance(quad.arg1, int) and isinstance(quad.arg2, int):
+                if not self.fold_relop(op, quad.arg1, quad.arg2):
+                    quad.res = quad.label + 1 # Falls through.
+                quad.op, quad.arg1, quad.arg2 = 'jump', '_', '_'
+                quad.arg1_bind = quad.arg2_bind = None
+        elif op == 'par' and quad.arg2 in ('REF', 'RET'):
+            if quad.arg1 in consts:
+                del consts[quad.arg1]
+        elif op == 'call':
+            for name in [name for name in consts if name not in self.tmpvars]:
+                del consts[name]
+
+
+    # Local common subexpression elimination by value numbering over the
+    # basic blocks of the block that starts at quad 'block_start_quad'.
+    # Every operand gets a value number: a constant is its own value
+    # number, a variable that is read before it is written in the basic
+    # block is numbered by its name and the result of an arithmetic quad
+    # by the quad itself, unless the same operation was applied to the
+    # same value numbers before. In that case, if some variable still
+    # holds that value, the quad becomes an assignment from it.
+    #   values  : value number of every variable
+    #   exprs   : value number of every (op, value number, value number)
+    #   holders : list of the variables holding every value number
+    #   binds   : Binding object of every variable
+    # A variable that is written, or may be written (see uses_defs()), by
+    # a quad gets a new value number, so the values it held before are
+    # no longer available through it.
+    def number_values(self, block_start_quad):
+        cfg = FlowGraph(self.quad_code[block_start_quad:])
+        escaping, nontemps = self.flow_names(cfg)
+        for block in cfg.blocks:
+            values, exprs, holders, binds = dict(), dict(), dict(), dict()
+            for quad in block.quads:
+                op = quad.op
+                if op in arithops and self.resolved(quad.arg1, quad.arg1_bind) and \
+                        self.resolved(quad.arg2, quad.arg2_bind):
+                    x = self.value_number(values, holders, binds, quad.arg1, quad.arg1_bind)
+                    y = self.value_number(values, holders, binds, quad.arg2, quad.arg2_bind)
+                    value = exprs.get((op, x, y))
+                    if value == None and op in ('+', '*'):
+                        value = exprs.get((op, y, x))
+                    if value == None:
+                        value = exprs[(op, x, y)] = quad
+                    elif holders.get(value):
+                        holder = holders[value][0]
+                        quad.op, quad.arg1, quad.arg2 = ':=', holder, '_'
+                        quad.arg1_bind, quad.arg2_bind = binds[holder], None
+                elif op == ':=' and self.resolved(quad.arg1, quad.arg1_bind):
+                    value = self.value_number(values, holders, binds, quad.arg1,
+                        quad.arg1_bind)
+                else:
+                    value = None
+                uses, defs, maydefs = self.uses_defs(quad, escaping, nontemps)
+                for name in defs | maydefs:
+                    self.set_value(values, holders, name, (quad, name))
+                if value != None and self.resolved(quad.res, quad.res_bind):
+                    binds[quad.res] = quad.res_bind
+                    self.set_value(values, holders, quad.res, value)
+
+
+    # True if operand 'v' (bound to 'b') is a constant or a variable, as
+    # opposed to an undeclared name (reported by final code generation).
+    def resolved(self, v, b):
+        if isinstance(v, int):
+            return True
+        return b != None and b.etype in ('VARIABLE', 'PARAMETER', 'TMPVAR')
+
+
+    # Return the value number of operand 'v' (bound to 'b'), given the
+    # dictionaries of number_values().
+    def value_number(self, values, holders, binds, v, b):
+        if isinstance(v, int):
+            return v
+        if v not in values:
+            binds[v] = b
+            self.set_value(values, holders, v, v)
+        return values[v]
+
+
+    # Record that variable 'name' holds value number 'value' (see
+    # number_values()).
+    def set_value(self, values, holders, name, value):
+        if name in values:
+            holders[values[name]].remove(name)
+        values[name] = value
+        holders.setdefault(value, list()).append(name)
+
+
+    # Copy propagation and coalescing over the block that starts at quad
+    # 'block_start_quad'. Within a basic block, after an assignment
+    # 'x := y' from an unaliased variable 'y', reads of 'x' read 'y'
+    # instead, until either of them is written or may be written (see
+    # uses_defs()). If 'y' is a temporary variable and 'x' is an unaliased
+    # one, reads of 'y' read 'x' instead, so that 'y' usually becomes dead.
+    # 'copies' maps every name to be replaced to the (name, Binding object)
+    # tuple of its replacement. Parameter quads are left unchanged, like in
+    # fold_constants(). Then, an assignment 'x := T' from a temporary
+    # variable that is read nowhere else is coalesced with the quad right
+    # before it, if that one computes 'T': the latter computes 'x' directly
+    # and the assignment is removed.
+    def propagate_copies(self, block_start_quad):
+        cfg = FlowGraph(self.quad_code[block_start_quad:])
+        escaping, nontemps = self.flow_names(cfg)
+        for block in cfg.blocks:
+            copies = dict()
+            for quad in block.quads:
+                op = quad.op
+                if op in arithops or op in relops or op in (':=', 'out', 'retv'):
+                    if quad.arg1 in copies:
+                        quad.arg1, quad.arg1_bind = copies[quad.arg1]
+                    if quad.arg2 in copies:
+                        quad.arg2, quad.arg2_bind = copies[quad.arg2]
+                uses, defs, maydefs = self.uses_defs(quad, escaping, nontemps)
+                if copies:
+                    for name in defs | maydefs:
+                        for dest in [dest for dest in copies if dest == name or \
+                                copies[dest][0] == name]:
+                            del copies[dest]
+                if op != ':=' or not isinstance(quad.arg1, str) or \
+                        quad.arg1 == quad.res or not self.resolved(quad.res, quad.res_bind):
+                    continue
+                if quad.arg1 in self.tmpvars and quad.res not in self.tmpvars and \
+                        self.unaliased(quad.res_bind):
+                    copies[quad.arg1] = (quad.res, quad.res_bind)
+                elif self.unaliased(quad.arg1_bind):
+                    copies[quad.res] = (quad.arg1, quad.arg1_bind)
+        reads = dict()
+        for quad in cfg.quads:
+            reads[quad.arg1] = reads.get(quad.arg1, 0) + 1
+            reads[quad.arg2] = reads.get(quad.arg2, 0) + 1
+        removed = set()
+        for block in cfg.blocks:
+            for prev, quad in zip(block.quads, block.quads[1:]):
+                if quad.op == ':=' and quad.arg1 in self.tmpvars and \
+                        reads[quad.arg1] == 1 and prev.res == quad.arg1 and \
+                        (prev.op in arithops or prev.op == ':=') and \
+                        self.resolved(quad.res, quad.res_bind):
+                    prev.res, prev.res_bind = quad.res, quad.res_bind
+                    removed.add(quad.label)
+        if removed:
+            self.compact_block(block_start_quad, removed)
+
+
+    # Return the label of the quad that control reaches from quad 'label'
+    # by following unconditional jumps.
+    def final_target(self, label):
+        seen = set()
+        while self.quad_code[label].op == 'jump' and label not in seen:
+            seen.add(label)
+            label = self.quad_code[label].res
+        return label
+
+
+    # Jump optimizations over the quads of the block that starts at quad
+    # 'block_start_quad'. In order:
+    #   - a conditional jump over an unconditional one (see boolfactor())
+    #     is negated to jump to the target of the latter, which becomes
+    #     a jump to the next quad, unless it is a jump target itself;
+    #   - jumps to jumps are threaded to their final target;
+    #   - a jump back to a loop test that is a single conditional jump
+    #     out of the loop, to the quad that follows the jump, is replaced
+    #     by a copy of the test, negated to jump back into the loop body,
+    #     so that an iteration executes a single branch.
+    # Jumps to the next quad are removed by eliminate_dead_code().
+    def optimize_jumps(self, block_start_quad):
+        quads = self.quad_code[block_start_quad:]
+        targets = set()
+        for quad in quads:
+            if quad.op == 'jump' or quad.op in relops:
+                targets.add(quad.res)
+        for quad, next_quad in zip(quads, quads[1:]):
+            if quad.op in relops and next_quad.op == 'jump' and \
+                    quad.res == next_quad.label + 1 and next_quad.label not in targets:
+                quad.op, quad.res = negated_relops[quad.op], next_quad.res
+                next_quad.res = next_quad.label + 1
+        for quad in quads:
+            if quad.op == 'jump' or quad.op in relops:
+                quad.res = self.final_target(quad.res)
+        for quad, next_quad in zip(quads, quads[1:]):
+            if quad.op != 'jump' or quad.res > quad.label:
+                continue
+            test = self.quad_code[quad.res]
+            if test.op in relops and test.res == self.final_target(next_quad.label):
+                quad.op, quad.arg1, quad.arg2 = negated_relops[test.op], test.arg1, test.arg2
+                quad.arg1_bind, quad.arg2_bind = test.arg1_bind, test.arg2_bind
+                quad.res = self.final_target(test.label + 1)
+
+
+    # Remove the unreachable quads and the dead assignments (assignments
+    # to unaliased variables that are not live afterwards, see
+    # liveness()) of the block that starts at quad 'block_start_quad'.
+    # The begin_block, halt and end_block quads are always kept, since
+    # final code refers to them. Removing a dead assignment may make
+    # others dead, so liveness is recomputed until nothing is removed;
+    # the control flow graph stays the same, while its blocks shrink.
+    # Last, jumps to the quad that follows them once the rest are
+    # removed are removed as well.
+    def eliminate_dead_code(self, block_start_quad):
+        cfg = FlowGraph(self.quad_code[block_start_quad:])
+        reachable = cfg.reachable()
+        escaping, nontemps = self.flow_names(cfg)
+        removed = set()
+        for block in cfg.blocks:
+            if block.index not in reachable:
+                for quad in block.quads:
+                    if quad.op not in ('begin_block', 'halt', 'end_block'):
+                        removed.add(quad.label)
+        while True:
+            for block in cfg.blocks:
+                block.quads = [quad for quad in block.quads if quad.label not in removed]
+            cfg.quads = [quad for quad in cfg.quads if quad.label not in removed]
+            names, live_in, live_out = self.liveness(cfg, escaping, nontemps)
+            bit_of = {name: bit for bit, name in enumerate(names)}
+            dead = set()
+            for block in cfg.blocks:
+                if block.index not in reachable:
+                    continue
+                live = live_out[block.index]
+                for quad in reversed(block.quads):
+                    if (quad.op in arithops or quad.op == ':=') and \
+                            self.unaliased(quad.res_bind) and \
+                            not live >> bit_of[quad.res] & 1:
+                        dead.add(quad.label)
+                        continue
+                    uses, defs, maydefs = self.uses_defs(quad, escaping, nontemps)
+                    live &= ~self.bit_vector(bit_of, defs)
+                    live |= self.bit_vector(bit_of, uses)
+            if not dead:
+                break
+            removed |= dead
+        self.remove_jumps_to_next(self.quad_code[block_start_quad:], removed)
+        if removed:
+            self.check_quads(block_start_quad, [quad for quad in
+                self.quad_code[block_start_quad:] if quad.label in removed])
+            self.compact_block(block_start_quad, removed)
+
+
+    # Add the labels of the jumps and conditional jumps of 'quads' that
+    # jump to the quad that follows them to set 'removed', given that
+    # the quads already in 'removed' are removed.
+    def remove_jumps_to_next(self, quads, removed):
+        next_kept = None  # Label of the next quad that is kept.
+        kept_from = dict() # Label of the first quad kept at or after every quad.
+        for quad in reversed(quads):
+            if quad.label not in removed and (quad.op == 'jump' or quad.op in relops) \
+                    and quad.res > quad.label and kept_from[quad.res] == next_kept:
+                removed.add(quad.label)
+            if quad.label not in removed:
+                next_kept = quad.label
+            kept_from[quad.label] = next_kept
+
+
+    # Translate 'quads' of the block that starts at quad 'block_start_quad'
+    # into final code that is thrown away. Final code generation performs
+    # semantic checks (e.g. of undeclared variables and subprogram
+    # arguments), which must not be skipped because an optimization
+    # removed the quads they apply to.
+    def check_quads(self, block_start_quad, quads):
+        block_start = self.quad_code[block_start_quad]
+        asm, self.asm = self.asm, AsmSections()
+        try:
+            for quad in quads:
+                self.gen_mips_asm(quad, block_start.arg1, block_start.arg1_bind)
+        finally:
+            self.asm = asm
+
+
+    # Remove the quads labeled by the labels of set 'removed' from the
+    # block that starts at quad 'block_start_quad' (the last block in
+    # quad_code) and renumber the rest, so that labels stay dense. Jumps
+    # to a removed quad are redirected to the next quad that is kept.
+    # The block's begin_block quad (its Function entity's start_quad)
+    # keeps its label, and the blocks before it are left unchanged.
+    def compact_block(self, block_start_quad, removed):
+        new_label = dict()
+        kept = list()
+        for quad in self.quad_code[block_start_quad:]:
+            new_label[quad.label] = block_start_quad + len(kept)
+            if quad.label not in removed:
+                kept.append(quad)
+        for quad in kept:
+            quad.label = new_label[quad.label]
+            if quad.op == 'jump' or quad.op in relops:
+                quad.res = new_label[quad.res]
+        if self.halt_label >= block_start_quad:
+            self.halt_label = new_label[self.halt_label]
+        self.quad_code[block_start_quad:] = kept
+        self.nextlabel = len(self.quad_code)
+
+
+    # Reassign the offsets of the temporary variables of the current scope
+    # (whose block starts at quad 'block_start_quad'), so that temporary
+    # variables that are never live at the same time share a stack slot.
+    # Temporary variables are declared after the parameters and variables
+    # of the scope, so their slots are the end of the activation record,
+    # which shrinks to the slots actually needed ('tmp_offset'). Two
+    # temporary variables conflict if one is written where the other is
+    # live; each one gets the first slot none of its conflicting ones got.
+    def allocate_temp_slots(self, block_start_quad):
+        scope = self.scopes[-1]
+        tmps = [entity for entity in scope.entities if entity.etype == 'TMPVAR']
+        if tmps == list():
+            return
+        cfg = FlowGraph(self.quad_code[block_start_quad:])
+        # Calls and aliasing never affect temporary variables.
+        names, live_in, live_out = self.liveness(cfg, set(), set())
+        conflicts = {tmp.name: set() for tmp in tmps}
+        for block in cfg.blocks:
+            live = self.bit_set(live_out[block.index], names)
+            for quad in reversed(block.quads):
+                uses, defs, maydefs = self.uses_defs(quad, set(), set())
+                defs &= conflicts.keys()
+                for name in defs:
+                    conflicts[name] |= live
+                    for other in live:
+                        conflicts[other].add(name)
+                live -= defs
+                live |= uses
+        base, slot_of = tmps[0].offset, dict()
+        for tmp in tmps:
+            taken = {slot_of.get(name) for name in conflicts[tmp.name] if name != tmp.name}
+            slot = 0
+            while slot in taken:
+                slot += 1
+            slot_of[tmp.name] = slot
+            tmp.offset = base + 4 * slot
+        scope.tmp_offset = base + 4 * (max(slot_of.values()) + 1)
+
+
+    # Cache the frame addresses of the enclosing blocks: reaching the
+    # frame of the block 'depth' levels out takes 'depth' loads along the
+    # access links (see frame_addr()), on every access to a non-local
+    # variable. The address of every such frame that the block refers to
+    # more than once is computed on entry instead, and kept in a slot of
+    # the frame of the block, so that each access takes a single load.
+    # The access link itself stays at offset -4. The frame of the block
+    # one level out is reached through it anyway, so it is not cached.
+    # Set 'self.frame_slots', which maps the depth of each cached frame
+    # to the offset of its slot.
+    def cache_frame_addrs(self, block_start_quad):
+        refs = dict()
+        for quad in self.quad_code[block_start_quad:]:
+            for b in (quad.arg1_bind, quad.arg2_bind, quad.res_bind):
+                if b != None and b.depth > 1 and self.via_access_links(quad, b):
+                    refs[b.depth] = refs.get(b.depth, 0) + 1
+        scope = self.scopes[-1]
+        for depth in sorted(refs):
+            if refs[depth] > 1:
+                self.frame_slots[depth] = scope.tmp_offset
+                scope.tmp_offset += 4
+
+
+    # True if the final code of quad 'quad' follows the access links to
+    # reach its operand bound to 'b': a non-local variable or parameter,
+    # or the frame that declares the subprogram a call quad calls, if the
+    # subprogram uses its access link (see gen_mips_asm()). Global
+    # variables are accessed through $s0, unless passed by reference.
+    def via_access_links(self, quad, b):
+        if b.depth == 0:
+            return False
+        if quad.op == 'call':
+            return b.entity.uses_access_link
+        if b.etype == 'VARIABLE' and b.level == 0:
+            return quad.op == 'par' and quad.arg2 == 'REF'
+        return b.etype == 'VARIABLE' or b.etype == 'PARAMETER'
+
+
+    # Find out how the block that starts at quad 'block_start_quad' uses
+    # the frames of the subprogram calls: 'self.leaf' becomes True if it
+    # is a subprogram that makes no calls, which therefore does not need
+    # to save $ra on entry, and the 'uses_access_link' attribute of the
+    # subprogram entity False if neither the subprogram nor any subprogram
+    # nested in it ever reads its access link, which its callers then do
+    # not need to store. The link reach of a scope is the number of
+    # levels out that its code, or the code of a nested scope, follows
+    # the access links through its frame. A recursive call only passes
+    # the access link on, so it does not count as a use.
+    def find_frame_uses(self, block_start_quad):
+        scope = self.scopes[-1]
+        name = self.quad_code[block_start_quad].arg1
+        entity = None
+        if name != self.mainprog_name:
+            entity = self.search_entity(name, "FUNCTION")[0]
+            entity.uses_access_link = False
+        leaf = True
+        for quad in self.quad_code[block_start_quad:]:
+            if quad.op == 'call':
+                leaf = False
+            for b in (quad.arg1_bind, quad.arg2_bind, quad.res_bind):
+                if b != None and self.via_access_links(quad, b):
+                    scope.link_reach = max(scope.link_reach, b.depth)
+        # Following k levels out goes through the access links of the
+        # k - 1 enclosing scopes too.
+        for k in range(1, scope.link_reach):
+            enclosing_scope = self.scopes[-1 - k]
+            enclosing_scope.link_reach = max(enclosing_scope.link_reach,
+                scope.link_reach - k)
+        if entity != None:
+            self.leaf = leaf
+            entity.uses_access_link = scope.link_reach > 0
+
+
+    # Linear scan register allocation over the block that starts at quad
+    # 'block_start_quad'. The candidates are the temporary variables and
+    # the local variables and 'in' parameters of the block that no nested
+    # subprogram refers to and that are never passed by reference or as a
+    # return value: nothing but the block itself reads or writes them, so
+    # calls are transparent to them. The live interval of a candidate
+    # spans the quads from the first to the last one it is live at.
+    # Intervals are scanned in order of their start; the ones that span
+    # a call need a callee-saved register, the rest preferably get a
+    # caller-saved one. When registers run out, the interval that ends
+    # last stays in memory. Set 'self.regs', which maps the allocated
+    # candidates to their registers, 'self.saved_regs', the list of the
+    # (register, offset) tuples of the callee-saved registers the block
+    # saves on entry, and 'self.entry_loads', the list of the (name,
+    # Binding object) tuples of the candidates live on entry.
+    def allocate_registers(self, block_start_quad):
+        cfg = FlowGraph(self.quad_code[block_start_quad:])
+        binds, memory = dict(), set()
+        for quad in cfg.quads:
+            if quad.op == 'par' and quad.arg2 != 'CV':
+                memory.add(quad.arg1)
+            for name, b in ((quad.arg1, quad.arg1_bind), (quad.arg2, quad.arg2_bind),
+                    (quad.res, quad.res_bind)):
+                if b != None and b.etype in ('VARIABLE', 'PARAMETER', 'TMPVAR'):
+                    binds[name] = b
+                    if not self.unaliased(b) or b.entity in self.nonlocal_entities:
+                        memory.add(name)
+        candidates = binds.keys() - memory
+        if not candidates:
+            return
+        # Liveness of the candidates, like in liveness().
+        bit_of = dict()
+        gen, kill, quad_uses_defs, calls = list(), list(), dict(), list()
+        for block in cfg.blocks:
+            uses = defs = 0
+            for quad in reversed(block.quads):
+                if quad.op == 'call':
+                    calls.append(quad.label)
+                    continue
+                quad_uses, quad_defs, quad_maydefs = \
+                    self.uses_defs(quad, set(), candidates)
+                quad_uses_defs[quad.label] = (quad_uses | quad_defs) & candidates
+                quad_defs = self.bit_vector(bit_of, quad_defs & candidates)
+                uses = (uses & ~quad_defs) | self.bit_vector(bit_of, quad_uses & candidates)
+                defs |= quad_defs
+            gen.append(uses)
+            kill.append(defs)
+        ins, outs = cfg.solve(False, gen, kill, 0)
+        names = sorted(bit_of, key=bit_of.get)
+        calls.sort()
+        # Live intervals: a candidate live somewhere inside a basic block
+        # is live on its entry or exit, or is read or written there.
+        start, end = dict(), dict()
+        for block in cfg.blocks:
+            points = [(block.quads[0].label, name)
+                for name in self.bit_set(ins[block.index], names)]
+            points += [(block.quads[-1].label, name)
+                for name in self.bit_set(outs[block.index], names)]
+            for quad in block.quads:
+                points += [(quad.label, name) for name in quad_uses_defs.get(quad.label, ())]
+            for label, name in points:
+                if name not in start or label < start[name]:
+                    start[name] = label
+                if name not in end or label > end[name]:
+                    end[name] = label
+        regs, active = dict(), list()
+        free = set(caller_saved_regs + callee_saved_regs)
+        for name in sorted(start, key=start.get):
+            for other in [other for other in active if end[other] < start[name]]:
+                active.remove(other)
+                free.add(regs[other])
+            call = bisect.bisect_right(calls, start[name])
+            if call < len(calls) and calls[call] < end[name]:
+                order = callee_saved_regs
+            else:
+                order = caller_saved_regs + callee_saved_regs
+            reg = next((reg for reg in order if reg in free), None)
+            if reg != None:
+                free.remove(reg)
+            else:
+                victims = [other for other in active if regs[other] in order]
+                if victims == list():
+                    continue
+                victim = max(victims, key=end.get)
+                if end[victim] <= end[name]:
+                    continue
+                active.remove(victim)
+                reg = regs.pop(victim)
+            regs[name] = reg
+            active.append(name)
+        self.regs = regs
+        if self.quad_code[block_start_quad].arg1 != self.mainprog_name:
+            scope = self.scopes[-1]
+            for reg in callee_saved_regs:
+                if reg in regs.values():
+                    self.saved_regs.append((reg, scope.tmp_offset))
+                    scope.tmp_offset += 4
+        self.entry_loads = [(name, binds[name])
+            for name in self.bit_set(ins[0], names) if name in regs]
+
+
+    ##############################################################
+    #                                                            #
+    #             Symbol table related functions                 #
+    #                                                            #
+    ##############################################################
+
+
+    # Add a new scope.
+    def add_new_scope(self):
+        enclosing_scope = self.scopes[-1]
+        curr_scope = Scope(enclosing_scope.nested_level + 1, enclosing_scope)
+        self.scopes.append(curr_scope)
+
+
+    # Print current scope and its enclosing ones.
+    def print_scopes(self):
+        print('* main scope\n|')
+        for scope in self.scopes:
+            level = scope.nested_level + 1
+            print('    ' * level + str(scope))
+            for entity in scope.entities:
+                print('|    ' * level + str(entity))
+                if isinstance(entity, Function):
+                    for arg in entity.args:
+                        print('|    ' * level + '|    ' + str(arg))
+        print('\n')
+
+
+    # Add a new function entity.
+    def add_func_entity(self, name):
+        # Function declarations are on the enclosing scope of
+        # the current scope.
+        nested_level = self.scopes[-1].enclosing_scope.nested_level
+        if not self.unique_entity(name, "FUNCTION", nested_level):
+            self.perror_line_exit(5, self.token.tkl, self.token.tkc,
+                'Redefinition of \'%s\'' % name)
+        if self.in_function[-1] == True:
+            ret_type = "int"
+        else:
+            ret_type = "void"
+        self.scopes[-2].addEntity(Function(name, ret_type))
 
 
-def new_temp():
-    global tmpvars, next_tmpvar
-    key = 'T_'+str(next_tmpvar)
-    tmpvars[key] = None
-    offset = scopes[-1].get_offset()
-    scopes[-1].addEntity(TmpVar(key, offset))
-    next_tmpvar += 1
-    return key
+    # Update the start quad label of a function entity.
+    def update_func_entity_quad(self, name):
+        start_quad = self.next_quad()
+        if name == self.mainprog_name:
+            return start_quad
+        func_entity = self.search_entity(name, "FUNCTION")[0]
+        func_entity.set_start_quad(start_quad)
+        return start_quad
 
 
-def empty_list():
-    return list()
+    # Update the framelength of a function entity.
+    def update_func_entity_framelen(self, name, framelength):
+        if name == self.mainprog_name:
+            self.main_programs_framelength = framelength
+            return
+        func_entity = self.search_entity(name, "FUNCTION")[0]
+        func_entity.set_framelen(framelength)
+
+
+    # Add a new parameter entity.
+    def add_param_entity(self, name, par_mode):
+        nested_level = self.scopes[-1].nested_level
+        par_offset   = self.scopes[-1].get_offset()
+        if not self.unique_entity(name, "PARAMETER", nested_level):
+            self.perror_line_exit(5, self.token.tkl, self.token.tkc,
+                'Redefinition of \'%s\'' % name)
+        self.scopes[-1].addEntity(Parameter(name, par_mode, par_offset))
+
+
+    # Add a new variable entity.
+    def add_var_entity(self, name):
+        nested_level = self.scopes[-1].nested_level
+        var_offset   = self.scopes[-1].get_offset()
+        if not self.unique_entity(name, "VARIABLE", nested_level):
+            self.perror_line_exit(5, self.token.tkl, self.token.tkc,
+                'Redefinition of \'%s\'' % name)
+        if self.var_is_param(name, nested_level):
+            self.perror_line_exit(5, self.token.tkl, self.token.tkc,
+                '\'%s\' redeclared as different kind of symbol' % name)
+        self.scopes[-1].addEntity(Variable(name, var_offset))
+
+
+    # Add a new function argument to a given function.
+    def add_func_arg(self, func_name, par_mode):
+        if (par_mode == 'in'):
+            new_arg = Argument('CV')
+        else:
+            new_arg = Argument('REF')
+        func_entity = self.search_entity(func_name, "FUNCTION")[0]
+        if func_entity == None:
+            self.perror_line_exit(5, self.token.tkl, self.token.tkc,
+                'No definition of \'%s\' was not found' % func_name)
+        if func_entity.args != list():
+            func_entity.args[-1].set_next(new_arg)
+        func_entity.add_arg(new_arg)
+
+
+    # Search for an entity named 'name' of type 'etype'.
+    def search_entity(self, name, etype):
+        if self.scopes == list():
+            return
+        tmp_scope = self.scopes[-1]
+        while tmp_scope != None:
+            entity = tmp_scope.lookup(name, etype)
+            if entity != None:
+                return entity, tmp_scope.nested_level
+            tmp_scope = tmp_scope.enclosing_scope
 
 
-def make_list(label):
-    newlist = list()
-    newlist.append(label)
-    return newlist
+    # Search for an entity named 'name'.
+    def search_entity_by_name(self, name):
+        if self.scopes == list():
+            return
+        tmp_scope = self.scopes[-1]
+        while tmp_scope != None:
+            entity = tmp_scope.lookup(name)
+            if entity != None:
+                return entity, tmp_scope.nested_level
+            tmp_scope = tmp_scope.enclosing_scope
+
+
+    # Resolve operand 'name' (of type 'etype' if not None) in the current
+    # scope. Return a Binding object, or None if 'name' is not an identifier
+    # or is undeclared. Bindings are cached per scope, so each identifier is
+    # searched for only once per scope.
+    def bind_operand(self, name, etype=None):
+        if not isinstance(name, str) or name == '_':
+            return None
+        scope = self.scopes[-1]
+        binding = scope.bindings.get((name, etype))
+        if binding == None:
+            if etype == None:
+                found = self.search_entity_by_name(name)
+            else:
+                found = self.search_entity(name, etype)
+            if found == None:
+                return None
+            entity, level = found
+            binding = Binding(entity, level, scope.nested_level - level)
+            if binding.depth > 0:
+                self.nonlocal_entities.add(entity)
+            scope.bindings[(name, etype)] = binding
+        return binding
+
+
+    # Check if entity named 'name' of type 'etype' at nested level
+    # 'nested_level' is redefined.
+    def unique_entity(self, name, etype, nested_level):
+        if self.scopes[-1].nested_level < nested_level:
+            return
+        return self.scopes[nested_level].lookup(name, etype) == None
+
+
+    # Check if a variable entity named 'name' already exists
+    # as a parameter entity.
+    def var_is_param(self, name, nested_level):
+        if self.scopes[-1].nested_level < nested_level:
+            return
+        return self.scopes[nested_level].lookup(name, "PARAMETER") != None
+
+
+    ##############################################################
+    #                                                            #
+    #               Final code related functions                 #
+    #                                                            #
+    ##############################################################
+
+
+    # Load in register $t0 the address of the frame of the block 'depth'
+    # (> 0) levels out, following the access links, or from its slot if
+    # it is cached (see cache_frame_addrs()).
+    def frame_addr(self, depth):
+        if depth in self.frame_slots:
+            self.asm.emit('    lw      $t0, -%d($sp)\n' % self.frame_slots[depth])
+            return
+        self.asm.emit('    lw      $t0, -4($sp)\n')
+        n = depth - 1
+        while  n > 0:
+            self.asm.emit('    lw      $t0, -4($t0)\n')
+            n -= 1
+
+
+    # Load in register $t0 the address of the non-local variable 'v'
+    # bound to 'b'.
+    def gnvlcode(self, v, b):
+        if b == None or b.etype == 'FUNCTION':
+            self.perror_exit(7, 'Undeclared variable:', v)
+        self.frame_addr(b.depth)
+        self.asm.emit('    addi    $t0, $t0, -%d\n' % b.entity.offset)
+
+
+    # Load immediate or data 'v' (bound to 'b') from memory to register 'r'.
+    def loadvr(self, v, r, b):
+        if isinstance(v, int):
+            self.asm.emit('    li      %s, %d\n' % (r, v))
+        else:
+            if b == None:
+                self.perror_exit(7, 'Undeclared variable:', v)
+            e = b.entity
+            if b.etype == 'VARIABLE' and b.level == 0:
+                self.asm.emit('    lw      %s, -%d($s0)\n' % (r, e.offset))
+            elif (b.etype == 'VARIABLE' and b.depth == 0) or \
+                    (b.etype == 'PARAMETER' and e.par_mode == 'in' and b.depth == 0) or \
+                    (b.etype == 'TMPVAR'):
+                self.asm.emit('    lw      %s, -%d($sp)\n' % (r, e.offset))
+            elif b.etype == 'PARAMETER' and e.par_mode == 'inout' and b.depth == 0:
+                self.asm.emit('    lw      $t0, -%d($sp)\n' % e.offset)
+                self.asm.emit('    lw      %s, 0($t0)\n' % r)
+            elif (b.etype == 'VARIABLE' and b.depth > 0) or \
+                    (b.etype == 'PARAMETER' and e.par_mode == 'in' and b.depth > 0):
+                self.gnvlcode(v, b)
+                self.asm.emit('    lw      %s, 0($t0)\n' % r)
+            elif b.etype == 'PARAMETER' and e.par_mode == 'inout' and b.depth > 0:
+                self.gnvlcode(v, b)
+                self.asm.emit('    lw      $t0, 0($t0)\n')
+                self.asm.emit('    lw      %s, 0($t0)\n' % r)
+            else:
+                self.perror_exit(6, 'loadvr loads an immediate or data from memory'
+                            'to a register')
+
+
+    # Store the contents of register 'r' to the memory allocated
+    # for variable 'v' (bound to 'b').
+    def storerv(self, r, v, b):
+        if b == None:
+            self.perror_exit(7, 'Undeclared variable:', v)
+        e = b.entity
+        if b.etype == 'VARIABLE' and b.level == 0:
+            self.asm.emit('    sw      %s, -%d($s0)\n' % (r, e.offset))
+        elif (b.etype == 'VARIABLE' and b.depth == 0) or \
+                (b.etype == 'PARAMETER' and e.par_mode == 'in' and b.depth == 0) or \
+                (b.etype == 'TMPVAR'):
+            self.asm.emit('    sw      %s, -%d($sp)\n' % (r, e.offset))
+        elif b.etype == 'PARAMETER' and e.par_mode == 'inout' and b.depth == 0:
+            self.asm.emit('    lw      $t0, -%d($sp)\n' % e.offset)
+            self.asm.emit('    sw      %s, 0($t0)\n' % r)
+        elif (b.etype == 'VARIABLE' and b.depth > 0) or \
+                (b.etype == 'PARAMETER' and e.par_mode == 'in' and b.depth > 0):
+            self.gnvlcode(v, b)
+            self.asm.emit('    sw      %s, 0($t0)\n' % r)
+        elif b.etype == 'PARAMETER' and e.par_mode == 'inout' and b.depth > 0:
+            self.gnvlcode(v, b)
+            self.asm.emit('    lw      $t0, 0($t0)\n')
+            self.asm.emit('    sw      %s, 0($t0)\n' % r)
+        else:
+            self.perror_exit(6, 'storerv stores the contents of a register to memory')
+
+
+    # Return the register that holds immediate or data 'v' (bound to 'b'):
+    # the one allocated to it (see allocate_registers()), $zero for
+    # immediate 0 at -O1 and above, or else register 'r', which it is
+    # loaded into.
+    def operand_reg(self, v, r, b):
+        reg = self.regs.get(v)
+        if reg == None:
+            if isinstance(v, int) and v == 0 and self.optlevel >= 1:
+                return '$zero'
+            self.loadvr(v, r, b)
+            reg = r
+        return reg
+
+
+    # Instruction selection for arithmetic quad 'quad' with an immediate
+    # operand, at -O1 and above: addi for addition and subtraction, sll
+    # for multiplication by a power of 2, and for division by a power of
+    # 2, sra after adding 2^k - 1 to negative dividends, since division
+    # truncates towards zero. The result goes to register 'res'. Return
+    # False, without generating any code, if none of them applies.
+    def gen_arith_imm(self, quad, res):
+        op, arg1, arg1_bind, arg2 = quad.op, quad.arg1, quad.arg1_bind, quad.arg2
+        if op in ('+', '*') and isinstance(arg1, int):
+            arg1, arg1_bind, arg2 = arg2, quad.arg2_bind, arg1
+        if isinstance(arg1, int) or not isinstance(arg2, int):
+            return False
+        if op == '-':
+            op, arg2 = '+', -arg2
+        if op == '+' and min_imm <= arg2 <= max_imm:
+            reg1 = self.operand_reg(arg1, '$t1', arg1_bind)
+            self.asm.emit('    addi    %s, %s, %d\n' % (res, reg1, arg2))
+            return True
+        if op not in ('*', '/') or arg2 <= 0 or arg2 & (arg2 - 1) != 0:
+            return False
+        k = arg2.bit_length() - 1
+        reg1 = self.operand_reg(arg1, '$t1', arg1_bind)
+        if k == 0:
+            self.asm.emit('    move    %s, %s\n' % (res, reg1))
+        elif op == '*':
+            self.asm.emit('    sll     %s, %s, %d\n' % (res, reg1, k))
+        else:
+            if k == 1:
+                self.asm.emit('    srl     $t2, %s, 31\n' % reg1)
+            else:
+                self.asm.emit('    sra     $t2, %s, 31\n' % reg1)
+                self.asm.emit('    srl     $t2, $t2, %d\n' % (32 - k))
+            self.asm.emit('    add     $t2, %s, $t2\n' % reg1)
+            self.asm.emit('    sra     %s, $t2, %d\n' % (res, k))
+        return True
 
 
-def merge(list1, list2):
-    return list1 + list2
+    # Instruction selection for relational quad 'quad' with an immediate
+    # operand, at -O1 and above: the branches that compare against zero
+    # (beqz, bltz, etc.), and slti followed by beqz or bnez for the
+    # ordering operators. Return False, without generating any code, if
+    # none of them applies.
+    def gen_branch_imm(self, quad):
+        relop, arg1, arg1_bind, arg2 = quad.op, quad.arg1, quad.arg1_bind, quad.arg2
+        if isinstance(arg1, int):
+            relop, arg1, arg1_bind, arg2 = swapped_relops[relop], arg2, quad.arg2_bind, arg1
+        if isinstance(arg1, int) or not isinstance(arg2, int):
+            return False
+        if arg2 == 0:
+            branch = ('beqz', 'bnez', 'bltz', 'blez', 'bgtz', 'bgez')[relops.index(relop)]
+            reg1 = self.operand_reg(arg1, '$t1', arg1_bind)
+            self.asm.emit('    %-7s %s, L_%d\n' % (branch, reg1, quad.res))
+            return True
+        # x <= C is x < C + 1, and x > C is not x < C + 1.
+        if relop in ('<=', '>'):
+            arg2 += 1
+        if relop in ('=', '<>') or arg2 > max_imm:
+            return False
+        reg1 = self.operand_reg(arg1, '$t1', arg1_bind)
+        self.asm.emit('    slti    $t2, %s, %d\n' % (reg1, arg2))
+        branch = 'bnez' if relop in ('<', '<=') else 'beqz'
+        self.asm.emit('    %-7s $t2, L_%d\n' % (branch, quad.res))
+        return True
 
 
-def backpatch(somelist, res):
-    global quad_code
-    for quad in quad_code:
-        if quad.label in somelist:
-            quad.res = res
+    # Generate the assembly code for quad 'quad'. 'block_name' is the name
+    # of the block that is currently translated into final code and
+    # 'block_bind' its binding (unused for the main program).
+    def gen_mips_asm(self, quad, block_name, block_bind):
+        self.asm.emit('\nL_' + str(quad.label) + ':   #' + quad.tofile() + '\n')
+        csc_relop = ('=', '<>', '<', '<=', '>', '>=')
+        asm_relop = ('beq', 'bne', 'blt', 'ble', 'bgt', 'bge')
+        csc_op    = ('+', '-', '*', '/')
+        asm_op    = ('add', 'sub', 'mul', 'div')
+        if quad.op == 'jump':
+            self.asm.emit('    j       L_%d\n' % quad.res)
+        elif quad.op in csc_relop:
+            if self.optlevel < 1 or not self.gen_branch_imm(quad):
+                relop = asm_relop[csc_relop.index(quad.op)]
+                reg1 = self.operand_reg(quad.arg1, '$t1', quad.arg1_bind)
+                reg2 = self.operand_reg(quad.arg2, '$t2', quad.arg2_bind)
+                self.asm.emit('    %s     %s, %s, L_%d\n' % (relop, reg1, reg2, quad.res))
+        elif quad.op == ':=':
+            res = self.regs.get(quad.res)
+            if res == None:
+                reg1 = self.operand_reg(quad.arg1, '$t1', quad.arg1_bind)
+                self.storerv(reg1, quad.res, quad.res_bind)
+            elif quad.arg1 in self.regs:
+                if self.regs[quad.arg1] != res:
+                    self.asm.emit('    move    %s, %s\n' % (res, self.regs[quad.arg1]))
+            else:
+                self.loadvr(quad.arg1, res, quad.arg1_bind)
+        elif quad.op in csc_op:
+            res = self.regs.get(quad.res, '$t1')
+            if self.optlevel < 1 or not self.gen_arith_imm(quad, res):
+                op = asm_op[csc_op.index(quad.op)]
+                reg1 = self.operand_reg(quad.arg1, '$t1', quad.arg1_bind)
+                reg2 = self.operand_reg(quad.arg2, '$t2', quad.arg2_bind)
+                self.asm.emit('    %s     %s, %s, %s\n' % (op, res, reg1, reg2))
+            if quad.res not in self.regs:
+                self.storerv(res, quad.res, quad.res_bind)
+        elif quad.op == 'out':
+            reg1 = self.operand_reg(quad.arg1, '$t9', quad.arg1_bind)
+            self.asm.emit('    li      $v0, 1\n')
+            self.asm.emit('    add     $a0, $zero, %s\n' % reg1)
+            self.asm.emit('    syscall   # service code 1: print integer\n')
+            self.asm.emit('    la      $a0, newline\n')
+            self.asm.emit('    li      $v0, 4\n')
+            self.asm.emit('    syscall   # service code 4: print (a null terminated) string\n')
+        elif quad.op == 'retv':
+            reg1 = self.operand_reg(quad.arg1, '$t1', quad.arg1_bind)
+            self.asm.emit('    lw      $t0, -8($sp)\n')
+            self.asm.emit('    sw      %s, 0($t0)\n' % reg1)
+            # Actually return to caller; just like end_block case.
+            for reg, offset in self.saved_regs:
+                self.asm.emit('    lw      %s, -%d($sp)\n' % (reg, offset))
+            if not self.leaf:
+                self.asm.emit('    lw      $ra, 0($sp)\n')
+            self.asm.emit('    jr      $ra\n')
+        elif quad.op == 'halt':
+            self.asm.emit('    li      $v0, 10   # service code 10: exit\n')
+            self.asm.emit('    syscall\n')
+        elif quad.op == 'par':
+            if block_name == self.mainprog_name:
+                framelength = self.main_programs_framelength
+            else:
+                framelength = block_bind.entity.framelength
+            if self.actual_pars == []:
+                self.asm.emit('    addi    $fp, $sp, -%d\n' % framelength)
+            self.actual_pars.append(quad)
+            param_offset = 12 + 4 * (len(self.actual_pars) - 1)
+            var_bind = quad.arg1_bind
+            if quad.arg2 == 'CV':
+                reg1 = self.operand_reg(quad.arg1, '$t0', var_bind)
+                self.asm.emit('    sw      %s, -%d($fp)\n' % (reg1, param_offset))
+            elif quad.arg2 == 'REF':
+                if var_bind == None:
+                    self.perror_exit(7, 'Undeclared variable:', quad.arg1)
+                var_entity = var_bind.entity
+                # Local variable or parameter of the caller.
+                if var_bind.depth == 0:
+                    if var_entity.etype == 'VARIABLE' or \
+                            (var_entity.etype == 'PARAMETER' and \
+                            var_entity.par_mode == 'in'):
+                        self.asm.emit('    addi    $t0, $sp, -%s\n' % var_entity.offset)
+                        self.asm.emit('    sw      $t0, -%d($fp)\n' % param_offset)
+                    elif var_entity.etype == 'PARAMETER' and \
+                            var_entity.par_mode == 'inout':
+                        self.asm.emit('    lw      $t0, -%d($sp)\n' % var_entity.offset)
+                        self.asm.emit('    sw      $t0, -%d($fp)\n' % param_offset)
+                else:
+                    if var_entity.etype == 'VARIABLE' or \
+                            (var_entity.etype == 'PARAMETER' and \
+                            var_entity.par_mode == 'in'):
+                        self.gnvlcode(quad.arg1, var_bind)
+                        self.asm.emit('    sw      $t0, -%d($fp)\n' % param_offset)
+                    elif var_entity.etype == 'PARAMETER' and \
+                            var_entity.par_mode == 'inout':
+                        self.gnvlcode(quad.arg1, var_bind)
+                        self.asm.emit('    lw      $t0, 0($t0)\n')
+                        self.asm.emit('    sw      $t0, -%d($fp)\n' % param_offset)
+            elif quad.arg2 == 'RET':
+                if var_bind == None:
+                    self.perror_exit(7, 'Undeclared variable:', quad.arg1)
+                self.asm.emit('    addi    $t0, $sp, -%d\n' % var_bind.entity.offset)
+                self.asm.emit('    sw      $t0, -8($fp)\n')
+        elif quad.op == 'call':
+            if block_name == self.mainprog_name:
+                framelength = self.main_programs_framelength
+            else:
+                framelength = block_bind.entity.framelength
+            if quad.arg1_bind == None:
+                self.perror_exit(7, 'Undefined function/procedure:', quad.arg1)
+            callee_entity = quad.arg1_bind.entity
+            # Without parameters, no 'par' quad has set $fp yet.
+            if self.actual_pars == [] and callee_entity.uses_access_link:
+                self.asm.emit('    addi    $fp, $sp, -%d\n' % framelength)
+            self.check_subprog_args(callee_entity)
+            # The access link of the callee, if it uses it, is the frame
+            # of the block that declares it.
+            if callee_entity.uses_access_link:
+                if quad.arg1_bind.depth == 0:
+                    self.asm.emit('    sw      $sp, -4($fp)\n')
+                else:
+                    self.frame_addr(quad.arg1_bind.depth)
+                    self.asm.emit('    sw      $t0, -4($fp)\n')
+            self.asm.emit('    addi    $sp, $sp, -%d\n' % framelength)
+            self.asm.emit('    jal     L_%s\n' % str(callee_entity.start_quad))
+            self.asm.emit('    addi    $sp, $sp, %d\n' % framelength)
+        elif quad.op == 'begin_block':
+            if not self.leaf:
+                self.asm.emit('    sw      $ra, 0($sp)\n')
+            if block_name == self.mainprog_name:
+                self.asm.prologue = '\n    .globl L_%d\n    .text\n\n' \
+                    '    j       L_%d   # main program\n' % (quad.label, quad.label)
+                #outfile.write('    addi    $sp, $sp, %d\n' % main_programs_framelength)
+                self.asm.emit('    move    $s0, $sp\n')
+            for reg, offset in self.saved_regs:
+                self.asm.emit('    sw      %s, -%d($sp)\n' % (reg, offset))
+            if self.frame_slots:
+                self.asm.emit('    lw      $t0, -4($sp)\n')
+                for depth in range(2, max(self.frame_slots) + 1):
+                    self.asm.emit('    lw      $t0, -4($t0)\n')
+                    if depth in self.frame_slots:
+                        self.asm.emit('    sw      $t0, -%d($sp)\n' %
+                            self.frame_slots[depth])
+            for name, b in self.entry_loads:
+                self.loadvr(name, self.regs[name], b)
+        elif quad.op == 'end_block':
+            if block_name == self.mainprog_name:
+                self.asm.emit('    j       L_%d\n' % self.halt_label)
+                # Hack for printing newline character
+                self.asm.emit_data('newline:  .asciiz    "\\n"\n\n')
+            else:
+                for reg, offset in self.saved_regs:
+                    self.asm.emit('    lw      %s, -%d($sp)\n' % (reg, offset))
+                if not self.leaf:
+                    self.asm.emit('    lw      $ra, 0($sp)\n')
+                self.asm.emit('    jr      $ra\n')
+
+
+    # Check if actual parameters of subprogram entity 'entity'
+    # are of the same type as typical parameters.
+    def check_subprog_args(self, entity):
+        name = entity.name
+        if entity.ret_type == 'int':
+            self.actual_pars.pop() # pop parameter of type 'RET'
+        if len(entity.args) != len(self.actual_pars):
+            self.perror_exit(7, '%s: Missmatching subprogram argument number' %
+                name)
+        #print('\ncheck')
+        for arg, quad in zip(entity.args, self.actual_pars):
+            #print(arg.par_mode, quad.arg2, arg, quad)
+            if not (arg.par_mode == quad.arg2):
+                if arg.par_mode == 'CV':
+                    ptype = 'int'
+                else:
+                    ptype = 'int *'
+                self.perror_exit(7,'%s: Expected parameter \'%s\' to be of'
+                    ' type "%s"' % (name, quad.arg1, ptype))
+        del self.actual_pars[:]
+
+
+    # Peephole optimization of the text section of the final code: try
+    # the rules of 'peephole_rules' on every instruction they apply to,
+    # and count the hits of each rule in 'self.peephole_hits'. After a
+    # hit, the rules are tried again a few instructions back, since the
+    # replacement may complete another pattern.
+    def optimize_asm(self):
+        # Most lines occur many times in the text (e.g. loads of the same
+        # variable), so every distinct line is parsed once, and its Instr
+        # object shared. Rules never modify an Instr object.
+        parsed = dict()
+        instrs = list()
+        for line in self.asm.text:
+            instr = parsed.get(line)
+            if instr == None:
+                instr = parsed[line] = parse_instr(line)
+            instrs.append(instr)
+        targets = set()
+        for instr in instrs + [parse_instr(line) for line in
+                self.asm.prologue.split('\n')]:
+            if instr.op in branch_ops or instr.op in ('j', 'jal'):
+                targets.add(instr.args[-1])
+        rules = dict()
+        for name, ops, rule in peephole_rules:
+            self.peephole_hits[name] = 0
+            for op in ops:
+                rules.setdefault(op, list()).append((name, rule))
+        # The instructions before the current one are in 'done', the rest
+        # in 'todo', in reverse order, so that a replacement only moves
+        # the instructions next to it.
+        done, todo = list(), instrs[::-1]
+        while todo != []:
+            if todo[-1].op not in rules:
+                done.append(todo.pop())
+                continue
+            window = done[-peep_lookbehind:]
+            i = len(window)
+            window += todo[:-peep_lookahead - 1:-1]
+            for name, rule in rules[todo[-1].op]:
+                match = rule(window, i, targets)
+                if match != None:
+                    start, stop, replacement = match
+                    del done[len(done) - (i - start):]
+                    del todo[len(todo) - (stop - i):]
+                    todo.extend(reversed(replacement))
+                    self.peephole_hits[name] += 1
+                    # Revisit the previous few instructions, which may
+                    # match a rule now.
+                    for k in range(min(4, len(done))):
+                        todo.append(done.pop())
+                    break
+            else:
+                done.append(todo.pop())
+        self.asm.text[:] = [instr.line for instr in done]
+
+
+    ##############################################################
+    #                                                            #
+    #                 Parser related functions                   #
+    #                                                            #
+    ##############################################################
+
+
+    def parser(self):
+        self.token = self.lex()
+        self.program()
+        # At this point syntax analysis has succeeded
+        # but we should check for stray tokens.
+        if self.token.tktype != TokenType.EOF:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'EOF\' but found \'%s\' instead' % self.token.tkval)
+        if self.int_file != None:
+            self.generate_int_code_file()
+        if self.ceq_file == None:
+            pass
+        elif self.have_subprog == False:
+            self.generate_c_code_file()
+        else:
+            self.pwarn('Nested functions are defined! Transformation of intermediate\n' \
+                + '          code to ANSI C equivalent cannot take place!')
+            self.ceq_file = None
+
+
+    # The following functions implement the syntax and semantic rules of CiScal grammar
+    # rev.3 (as of March 3, 2017), including any additional specifications published at
+    # a later time (as of April 26, 2017). For this reason, no further documentation is
+    # necessary other than the one found in ciscal-grammar.pdf and the corresponding
+    # specifications documents.
+
+
+    def program(self):
+        if self.token.tktype == TokenType.PROGRAMSYM:
+            self.token = self.lex()
+            if self.token.tktype == TokenType.IDENT:
+                self.mainprog_name = name = self.token.tkval
+                self.token = self.lex()
+                self.scopes.append(Scope())
+                self.block(name)
+            else:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected program name but found \'%s\' instead' % self.token.tkval)
+        else:
+            self.perror_exit(3, 'Missing \'program\' keyword')
+
+
+    def block(self, name):
+        #print("ENTERING ", name)
+        #print_scopes()
+        if self.token.tktype == TokenType.LBRACE:
+            self.token = self.lex()
+            self.declarations()
+            self.subprograms()
+            block_start_quad = self.update_func_entity_quad(name)
+            self.gen_quad('begin_block', name)
+            self.sequence()
+            if self.token.tktype != TokenType.RBRACE:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected block end (\'}\') but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected block start (\'{\') but found \'%s\' instead' % self.token.tkval)
+        if name == self.mainprog_name:
+            self.halt_label = self.next_quad()
+            self.gen_quad('halt')
+        self.gen_quad('end_block', name)
+        self.optimize_block(block_start_quad)
+        self.update_func_entity_framelen(name, self.scopes[-1].tmp_offset)
+        #print("LEAVING ", name)
+        #print_scopes()
+        if self.dot_file != None:
+            self.generate_dot_subgraph(name, block_start_quad)
+        block_bind = self.quad_code[block_start_quad].arg1_bind
+        for quad in self.quad_code[block_start_quad:]:
+            self.gen_mips_asm(quad, name, block_bind)
+        self.scopes.pop()
+
+
+    def declarations(self):
+        if self.token.tktype == TokenType.DECLARESYM:
+            self.token = self.lex()
+            self.varlist()
+            if self.token.tktype != TokenType.ENDDECLSYM:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \'enddeclare\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+
+
+    def varlist(self):
+        if self.token.tktype == TokenType.IDENT:
+            self.add_var_entity(self.token.tkval)
+            self.token = self.lex()
+            while self.token.tktype == TokenType.COMMA:
+                self.token = self.lex()
+                if self.token.tktype != TokenType.IDENT:
+                    self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                        'Expected variable declaration but found \'%s\' instead'
+                        % self.token.tkval)
+                self.add_var_entity(self.token.tkval)
+                self.token = self.lex()
+
+
+    def subprograms(self):
+        while self.token.tktype == TokenType.PROCSYM or self.token.tktype == TokenType.FUNCSYM:
+            self.in_function.append(False)
+            self.have_return.append(False)
+            self.have_subprog = True
+            if self.token.tktype == TokenType.FUNCSYM:
+                self.in_function[-1] = True
+            self.token = self.lex()
+            self.func()
+            if self.in_function.pop() == True:
+                if self.have_return.pop() == False:
+                    self.perror_line_exit(4, self.token.tkl, self.token.tkc,
+                        'Expected return statement in function body')
+            else:
+                self.have_return.pop()
 
 
-# Generate a file containing the intermediate code
-# of the user program.
-def generate_int_code_file():
-    for quad in quad_code:
-        int_file.write(quad.tofile() + '\n')
-    int_file.close()
+    def func(self):
+        self.add_new_scope()
+        if self.token.tktype == TokenType.IDENT:
+            name = self.token.tkval
+            self.token = self.lex()
+            self.add_func_entity(name)
+            self.funcbody(name)
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected procedure/function name but found \'%s\' instead' % self.token.tkval)
 
 
-# A naive way to find which variables should be declared.
-def find_var_decl(quad):
-    vars = dict()
-    index = quad_code.index(quad) + 1
-    while True:
-        q = quad_code[index]
-        if q.op == 'end_block':
-            break
-        if q.arg2 not in ('CV', 'REF', 'RET') and q.op != 'call':
-            if isinstance(q.arg1, str):
-                vars[q.arg1] = 'int'
-            if isinstance(q.arg2, str):
-                vars[q.arg2] = 'int'
-            if isinstance(q.res, str):
-                vars[q.res] = 'int'
-        index += 1
-    if '_' in vars:
-        del vars['_']
-    return OrderedDict(sorted(vars.items()))
-
-
-# Transform variable declarations to ANSI C equivalent.
-def transform_decls(vars):
-    flag = False
-    retval = '\n\tint '
-    for var in vars:
-        flag = True
-        retval += var + ', '
-    if flag == True:
-        return retval[:-2] + ';'
-    else:
-        return ''
+    def funcbody(self, name):
+        self.formalpars(name)
+        self.block(name)
 
 
-# Transform a quad to ANSI C code.
-def transform_to_c(quad):
-    addlabel = True
-    if quad.op == 'jump':
-        retval = 'goto L_' + str(quad.res) + ';'
-    elif quad.op in ('=', '<>', '<', '<=', '>', '>='):
-        op = quad.op
-        if op == '=':
-            op = '=='
-        elif op == '<>':
-            op = '!='
-        retval = 'if (' + str(quad.arg1) + ' ' + op + ' ' + \
-            str(quad.arg2) + ') goto L_' + str(quad.res) + ';'
-    elif quad.op == ':=':
-        retval = quad.res + ' = ' + str(quad.arg1) + ';'
-    elif quad.op in ('+', '-', '*', '/'):
-        retval = quad.res + ' = ' + str(quad.arg1) + ' ' + \
-            str(quad.op) + ' ' + str(quad.arg2) + ';'
-    elif quad.op == 'out':
-        retval = 'printf("%d\\n", ' + str(quad.arg1) + ');'
-    elif quad.op == 'retv':
-        retval = 'return (' + str(quad.arg1) + ');'
-    elif quad.op == 'begin_block':
-        addlabel = False
-        if quad.arg1 == mainprog_name:
-            retval = 'int main(void)\n{'
-        else: # Should never reach else.
-            retval = 'int ' + quad.arg1 + '()\n{'
-        vars = find_var_decl(quad)
-        retval += transform_decls(vars)
-        retval += '\n\tL_' + str(quad.label) + ':'
-    elif quad.op == 'call':
-        # Should never reach this line.
-        retval = quad.arg1 + '();'
-    elif quad.op == 'end_block':
-        addlabel = False
-        retval = '\tL_' + str(quad.label) + ': {}\n'
-        retval += '}\n'
-    elif quad.op == 'halt':
-        retval = 'return 0;' # change to exit() if arbitrary
-                             # halt statements are enabled
-                             # at a later time.
-    else:
-        return None
-    if addlabel == True:
-        retval = '\tL_' + str(quad.label) + ': ' + retval
-    return retval
+    def formalpars(self, func_name):
+        if self.token.tktype == TokenType.LPAREN:
+            self.token = self.lex()
+            if self.token.tktype == TokenType.INSYM or self.token.tktype == TokenType.INOUTSYM:
+                self.formalparlist(func_name)
+            if self.token.tktype != TokenType.RPAREN:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'(\' but found \'%s\' instead' % self.token.tkval)
+
+
+    def formalparlist(self, func_name):
+        self.formalparitem(func_name)
+        while self.token.tktype == TokenType.COMMA:
+            self.token = self.lex()
+            if self.token.tktype != TokenType.INSYM and self.token.tktype != TokenType.INOUTSYM:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected formal parameter declaration but found \'%s\' instead'
+                    % self.token.tkval)
+            self.formalparitem(func_name)
+
+
+    def formalparitem(self, func_name):
+        if self.token.tktype == TokenType.INSYM or self.token.tktype == TokenType.INOUTSYM:
+            par_mode = self.token.tkval
+            self.token = self.lex()
+            if self.token.tktype != TokenType.IDENT:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected formal parameter name but found \'%s\' instead'
+                    % self.token.tkval)
+            par_name = self.token.tkval
+            self.add_func_arg(func_name, par_mode)
+            self.add_param_entity(par_name, par_mode)
+            self.token = self.lex()
+
+
+    def sequence(self):
+        self.statement()
+        while self.token.tktype == TokenType.SEMICOLON:
+            self.token = self.lex()
+            self.statement();
+
+
+    def brackets_seq(self):
+        if self.token.tktype == TokenType.LBRACE:
+            self.token = self.lex()
+            self.sequence()
+            if self.token.tktype != TokenType.RBRACE:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected end of bracket sequence (\'}\') but found \'%s\' instead'
+                    % self.token.tkval)
+            self.token = self.lex()
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected start of bracket sequence (\'{\') but found \'%s\' instead'
+                % self.token.tkval)
 
 
-# Generate a file containing the ANSI C equivalent code
-# of intermediate code. This file is ready to compile.
-def generate_c_code_file():
-    ceq_file.write('#include <stdio.h>\n\n')
-    ceq_file.write('/* This file was automatically generated by:\n')
-    ceq_file.write(' *     CiScal Compiler ' + __version__ + '\n')
-    ceq_file.write(' */\n\n')
-    for quad in quad_code:
-        tmp = transform_to_c(quad)
-        if tmp != None:
-            ceq_file.write(tmp + '\n')
-    ceq_file.close()
+    def brack_or_stat(self):
+        if self.token.tktype == TokenType.LBRACE:
+            self.brackets_seq()
+        else:
+            self.statement()
+            if self.token.tktype != TokenType.SEMICOLON:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \';\' after single or empty statement but found \'%s\' instead'
+                    % self.token.tkval)
+            self.token = self.lex()
+
+
+    def statement(self):
+        if self.token.tktype == TokenType.IDENT:
+            lhand = self.token.tkval
+            self.token = self.lex()
+            rhand = self.assignment_stat()
+            self.gen_quad(':=', rhand, '_', lhand)
+        elif self.token.tktype == TokenType.IFSYM:
+            self.token = self.lex()
+            self.if_stat()
+        elif self.token.tktype == TokenType.DOSYM:
+            self.token = self.lex()
+            self.do_while_stat()
+        elif self.token.tktype == TokenType.WHILESYM:
+            self.token = self.lex()
+            self.while_stat()
+        elif self.token.tktype == TokenType.SELECTSYM:
+            self.token = self.lex()
+            self.select_stat()
+        elif self.token.tktype == TokenType.EXITSYM:
+            if self.in_dowhile == []:
+                self.perror_line_exit(4, self.token.tkl, self.token.tkc,
+                    'Encountered \'exit\' outside of a do-while loop')
+            e_list = self.make_list(self.next_quad())
+            self.gen_quad('jump')
+            self.exit_dowhile[-1] = e_list
+            self.token = self.lex()
+            # No need to define exit_stat();
+            # only to consume token.
+        elif self.token.tktype == TokenType.RETURNSYM:
+            if self.in_function == [] or self.in_function[-1] == False:
+                self.perror_line_exit(4, self.token.tkl, self.token.tkc,
+                    'Encountered \'return\' outside of function definition')
+            else:
+                self.have_return[-1] = True
+            self.token = self.lex()
+            self.return_stat()
+        elif self.token.tktype == TokenType.PRINTSYM:
+            self.token = self.lex()
+            self.print_stat()
+        elif self.token.tktype == TokenType.CALLSYM:
+            self.token = self.lex()
+            self.call_stat()
+
+
+    def assignment_stat(self):
+        if self.token.tktype == TokenType.BECOMES:
+            self.token = self.lex()
+            return self.expression()
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \':=\' but found \'%s\' instead' % self.token.tkval)
+
+
+    def if_stat(self):
+        if self.token.tktype == TokenType.LPAREN:
+            self.token = self.lex()
+            (b_true, b_false) = self.condition()
+            if self.token.tktype != TokenType.RPAREN:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+            self.backpatch(b_true, self.next_quad())
+            self.brack_or_stat()
+            skip_list = self.make_list(self.next_quad())
+            self.gen_quad('jump')
+            self.backpatch(b_false, self.next_quad())
+            self.elsepart()
+            self.backpatch(skip_list, self.next_quad())
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'(\' after \'if\' but found \'%s\' instead' % self.token.tkval)
+
+
+    def elsepart(self):
+        if self.token.tktype == TokenType.ELSESYM:
+            self.token = self.lex()
+            self.brack_or_stat()
+
+
+    def while_stat(self):
+        b_quad = self.next_quad()
+        if self.token.tktype == TokenType.LPAREN:
+            self.token = self.lex()
+            (b_true, b_false) = self.condition()
+            if self.token.tktype != TokenType.RPAREN:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+            self.backpatch(b_true, self.next_quad())
+            self.brack_or_stat()
+            self.gen_quad('jump','_','_',b_quad)
+            self.backpatch(b_false, self.next_quad())
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'(\' after \'while\' but found \'%s\' instead'
+                % self.token.tkval)
+
+
+    def select_stat(self):
+        if self.token.tktype == TokenType.LPAREN:
+            self.token = self.lex()
+            if self.token.tktype == TokenType.IDENT:
+                id = self.token.tkval
+                self.token = self.lex()
+                if self.token.tktype == TokenType.RPAREN:
+                    self.token = self.lex()
+                    const = 1
+                    exit_list = self.empty_list()
+                    while self.token.tktype == TokenType.NUMBER:
+                        number = int(self.token.tkval)
+                        if number != const:
+                            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                                'Expected \'%d\' as case constant but found \'%s\' instead'
+                                % (const,self.token.tkval))
+                        const += 1
+                        self.token = self.lex()
+                        if self.token.tktype == TokenType.COLON:
+                            true_list = self.make_list(self.next_quad())
+                            self.gen_quad('=', id, number)
+                            false_list = self.make_list(self.next_quad())
+                            self.gen_quad('jump')
+                            self.backpatch(true_list, self.next_quad())
+                            self.token = self.lex()
+                            self.brack_or_stat()
+                            tmp_list = self.make_list(self.next_quad())
+                            self.gen_quad('jump')
+                            exit_list = self.merge(exit_list, tmp_list)
+                            self.backpatch(false_list, self.next_quad())
+                        else:
+                            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                                'Expected \':\' after case constant but found \'%s\' instead'
+                                % self.token.tkval)
+                    if self.token.tktype == TokenType.DEFAULTSYM:
+                        self.token = self.lex()
+                        if self.token.tktype == TokenType.COLON:
+                            self.token = self.lex()
+                            self.brack_or_stat()
+                            self.backpatch(exit_list, self.next_quad())
+                        else:
+                            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                                'Expected \':\' after default keyword but found \'%s\' instead'
+                                % self.token.tkval)
+                    else:
+                        self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                            'Expected \'default\' case but found \'%s\' instead'
+                            % self.token.tkval)
+                else:
+                    self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                        'Expected \')\' but found \'%s\' instead'
+                        % self.token.tkval)
+            else:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected variable identifier but found \'%s\' instead'
+                    % self.token.tkval)
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'(\' after \'select\' but found \'%s\' instead'
+                % self.token.tkval)
+
+
+    def do_while_stat(self):
+        self.in_dowhile.append(True)
+        self.exit_dowhile.append(None)
+        s_quad = self.next_quad()
+        self.brack_or_stat()
+        if self.token.tktype == TokenType.WHILESYM:
+            self.token = self.lex()
+            if self.token.tktype == TokenType.LPAREN:
+                self.token = self.lex()
+                (c_true, c_false) = self.condition()
+                if self.token.tktype != TokenType.RPAREN:
+                    self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                        'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+                self.backpatch(c_true, s_quad)
+                e_quad = self.next_quad()
+                self.backpatch(c_false, e_quad)
+                self.token = self.lex()
+            else:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \'(\' after \'while\' but found \'%s\' instead'
+                    % self.token.tkval)
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'while\' token but found \'%s\' instead' % self.token.tkval)
+        if self.exit_dowhile[-1] != None:
+            self.backpatch(self.exit_dowhile[-1], e_quad)
+        self.exit_dowhile.pop()
+        self.in_dowhile.pop()
+
+
+    def return_stat(self):
+        if self.token.tktype == TokenType.LPAREN:
+            self.token = self.lex()
+            exp   = self.expression()
+            self.gen_quad('retv', exp)
+            if self.token.tktype != TokenType.RPAREN:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'(\' after \'return\' but found \'%s\' instead'
+                % self.token.tkval)
+
+
+    def print_stat(self):
+        if self.token.tktype == TokenType.LPAREN:
+            self.token = self.lex()
+            exp   = self.expression()
+            self.gen_quad('out', exp)
+            if self.token.tktype != TokenType.RPAREN:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'(\' after \'print\' but found \'%s\' instead'
+                % self.token.tkval)
 
 
-##############################################################
-#                                                            #
-#             Symbol table related functions                 #
-#                                                            #
-##############################################################
+    def call_stat(self):
+        if self.token.tktype == TokenType.IDENT:
+            procid = self.token.tkval
+            self.token  = self.lex()
+            self.actualpars()
+            try:
+                proce, procl = self.search_entity_by_name(procid)
+            except:
+                self.perror_line_exit(7, self.token.tkl, self.token.tkc,
+                'Undefined procedure \'%s\'' % procid)
+            self.gen_quad('call', procid)
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected procedure name but found \'%s\' instead' % self.token.tkval)
+
+
+    def actualpars(self):
+        if self.token.tktype == TokenType.LPAREN:
+            self.token = self.lex()
+            if self.token.tktype == TokenType.INSYM or self.token.tktype == TokenType.INOUTSYM:
+                self.actualparlist()
+            if self.token.tktype != TokenType.RPAREN:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+            return True
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'(\' after procedure/function name but found \'%s\' instead'
+                % self.token.tkval)
+
+
+    def actualparlist(self):
+        self.actualparitem()
+        while self.token.tktype == TokenType.COMMA:
+            self.token = self.lex()
+            self.actualparitem()
+
+
+    def actualparitem(self):
+        if self.token.tktype == TokenType.INSYM:
+            self.token = self.lex()
+            exp   = self.expression()
+            self.gen_quad('par', exp, 'CV')
+        elif self.token.tktype == TokenType.INOUTSYM:
+            self.token = self.lex()
+            parid = self.token.tkval
+            if self.token.tktype != TokenType.IDENT:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected variable identifier but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+            self.gen_quad('par', parid, 'REF')
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected parameter type but found \'%s\' instead' % self.token.tkval)
+
+
+    def condition(self):
+        (b_true, b_false) = (q1_true, q1_false) = self.boolterm()
+        while self.token.tktype == TokenType.ORSYM:
+            self.backpatch(b_false, self.next_quad())
+            self.token = self.lex()
+            (q2_true, q2_false) = self.boolterm()
+            b_true  = self.merge(b_true, q2_true)
+            b_false = q2_false
+        return (b_true, b_false)
+
+
+    def boolterm(self):
+        (q_true, q_false) = (r1_true, r1_false) = self.boolfactor()
+        while self.token.tktype == TokenType.ANDSYM:
+            self.backpatch(q_true, self.next_quad())
+            self.token = self.lex()
+            (r2_true, r2_false) = self.boolfactor()
+            q_false = self.merge(q_false, r2_false)
+            q_true  = r2_true
+        return (q_true, q_false)
+
+
+    def boolfactor(self):
+        if self.token.tktype == TokenType.NOTSYM:
+            self.token = self.lex()
+            if self.token.tktype == TokenType.LBRACKET:
+                self.token = self.lex()
+                retval = self.condition()
+                retval = retval[::-1] # reverse lists
+                if self.token.tktype != TokenType.RBRACKET:
+                    self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                        'Expected \']\' but found \'%s\' instead' % self.token.tkval)
+                self.token = self.lex()
+            else:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \'[\' after \'not\' but found \'%s\' instead'
+                    % self.token.tkval)
+        elif self.token.tktype == TokenType.LBRACKET:
+            self.token = self.lex()
+            retval = self.condition()
+            if self.token.tktype != TokenType.RBRACKET:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \']\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+        else:
+            exp1   = self.expression()
+            op     = self.relational_oper()
+            exp2   = self.expression()
+            r_true = self.make_list(self.next_quad())
+            self.gen_quad(op, exp1, exp2)
+            r_false = self.make_list(self.next_quad())
+            self.gen_quad('jump')
+            retval = (r_true, r_false)
+        return retval
 
 
-# Add a new scope.
-def add_new_scope():
-    enclosing_scope = scopes[-1]
-    curr_scope = Scope(enclosing_scope.nested_level + 1, enclosing_scope)
-    scopes.append(curr_scope)
-
-
-# Print current scope and its enclosing ones.
-def print_scopes():
-    print('* main scope\n|')
-    for scope in scopes:
-        level = scope.nested_level + 1
-        print('    ' * level + str(scope))
-        for entity in scope.entities:
-            print('|    ' * level + str(entity))
-            if isinstance(entity, Function):
-                for arg in entity.args:
-                    print('|    ' * level + '|    ' + str(arg))
-    print('\n')
-
-
-# Add a new function entity.
-def add_func_entity(name):
-    # Function declarations are on the enclosing scope of
-    # the current scope.
-    nested_level = scopes[-1].enclosing_scope.nested_level
-    if not unique_entity(name, "FUNCTION", nested_level):
-        perror_line_exit(5, token.tkl, token.tkc,
-            'Redefinition of \'%s\'' % name)
-    if in_function[-1] == True:
-        ret_type = "int"
-    else:
-        ret_type = "void"
-    scopes[-2].addEntity(Function(name, ret_type))
+    def expression(self):
+        opsign = self.optional_sign()
+        term1  = self.term()
+        # unary minus
+        if opsign != None:
+            signtmp = self.new_temp()
+            self.gen_quad('-', 0, term1, signtmp)
+            term1 = signtmp
+        while self.token.tktype == TokenType.PLUS or self.token.tktype == TokenType.MINUS:
+            op     = self.add_oper()
+            term2  = self.term()
+            tmpvar = self.new_temp()
+            self.gen_quad(op, term1, term2, tmpvar)
+            term1 = tmpvar
+        return term1
+
+
+    def term(self):
+        factor1 = self.factor()
+        while self.token.tktype == TokenType.TIMES or self.token.tktype == TokenType.SLASH:
+            op      = self.mul_oper()
+            factor2 = self.factor()
+            tmpvar  = self.new_temp()
+            self.gen_quad(op, factor1, factor2, tmpvar)
+            factor1 = tmpvar
+        return factor1
+
+
+    def factor(self):
+        if self.token.tktype == TokenType.NUMBER or self.token.tktype == TokenType.PLUS or \
+                self.token.tktype == TokenType.MINUS:
+            retval = self.number_const()
+        elif self.token.tktype == TokenType.LPAREN:
+            self.token  = self.lex()
+            retval = self.expression()
+            if self.token.tktype != TokenType.RPAREN:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                    'Expected \')\' but found \'%s\' instead' % self.token.tkval)
+            self.token = self.lex()
+        elif self.token.tktype == TokenType.IDENT:
+            retval = self.token.tkval
+            self.token  = self.lex()
+            tail   = self.idtail()
+            if tail != None:
+                funcret = self.new_temp()
+                self.gen_quad('par', funcret, 'RET')
+                try:
+                    funce, funcl = self.search_entity_by_name(retval)
+                except:
+                    self.perror_line_exit(7, self.token.tkl, self.token.tkc,
+                    'Undefined function \'%s\'' % retval)
+                self.gen_quad('call', retval)
+                retval = funcret
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected factor but found \'%s\' instead' % self.token.tkval)
+        return retval
 
 
-# Update the start quad label of a function entity.
-def update_func_entity_quad(name):
-    start_quad = next_quad()
-    if name == mainprog_name:
-        return start_quad
-    func_entity = search_entity(name, "FUNCTION")[0]
-    func_entity.set_start_quad(start_quad)
-    return start_quad
-
-
-# Update the framelength of a function entity.
-def update_func_entity_framelen(name, framelength):
-    global main_programs_framelength
-    if name == mainprog_name:
-        main_programs_framelength = framelength
-        return
-    func_entity = search_entity(name, "FUNCTION")[0]
-    func_entity.set_framelen(framelength)
-
-
-# Add a new parameter entity.
-def add_param_entity(name, par_mode):
-    nested_level = scopes[-1].nested_level
-    par_offset   = scopes[-1].get_offset()
-    if not unique_entity(name, "PARAMETER", nested_level):
-        perror_line_exit(5, token.tkl, token.tkc,
-            'Redefinition of \'%s\'' % name)
-    scopes[-1].addEntity(Parameter(name, par_mode, par_offset))
-
-
-# Add a new variable entity.
-def add_var_entity(name):
-    nested_level = scopes[-1].nested_level
-    var_offset   = scopes[-1].get_offset()
-    if not unique_entity(name, "VARIABLE", nested_level):
-        perror_line_exit(5, token.tkl, token.tkc,
-            'Redefinition of \'%s\'' % name)
-    if var_is_param(name, nested_level):
-        perror_line_exit(5, token.tkl, token.tkc,
-            '\'%s\' redeclared as different kind of symbol' % name)
-    scopes[-1].addEntity(Variable(name, var_offset))
-
-
-# Add a new function argument to a given function.
-def add_func_arg(func_name, par_mode):
-    if (par_mode == 'in'):
-        new_arg = Argument('CV')
-    else:
-        new_arg = Argument('REF')
-    func_entity = search_entity(func_name, "FUNCTION")[0]
-    if func_entity == None:
-        perror_line_exit(5, token.tkl, token.tkc,
-            'No definition of \'%s\' was not found' % func_name)
-    if func_entity.args != list():
-        func_entity.args[-1].set_next(new_arg)
-    func_entity.add_arg(new_arg)
-
-
-# Search for an entity named 'name' of type 'etype'.
-def search_entity(name, etype):
-    if scopes == list():
-        return
-    tmp_scope = scopes[-1]
-    while tmp_scope != None:
-        for entity in tmp_scope.entities:
-            if entity.name == name and entity.etype == etype:
-                return entity, tmp_scope.nested_level
-        tmp_scope = tmp_scope.enclosing_scope
+    # Custom function that returns the numeric value
+    # of a constant. Optional sign is taken into account.
+    def number_const(self):
+        sign = '+'
+        if self.token.tktype == TokenType.PLUS or self.token.tktype == TokenType.MINUS:
+            sign = self.token.tkval
+            self.token = self.lex()
+        if self.token.tktype == TokenType.NUMBER:
+            numval = int(''.join((sign, self.token.tkval)))
+            if numval < min_int or numval > max_int:
+                self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                   'Number constants should be between -32768 and 32767')
+        else:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected number constant but found \'%s\' instead' % self.token.tkval)
+        self.token = self.lex()
+        return numval
 
 
-# Search for an entity named 'name'.
-def search_entity_by_name(name):
-    if scopes == list():
-        return
-    tmp_scope = scopes[-1]
-    while tmp_scope != None:
-        for entity in tmp_scope.entities:
-            if entity.name == name:
-                return entity, tmp_scope.nested_level
-        tmp_scope = tmp_scope.enclosing_scope
-
-
-# Check if entity named 'name' of type 'etype' at nested level
-# 'nested_level' is redefined.
-def unique_entity(name, etype, nested_level):
-    if scopes[-1].nested_level < nested_level:
-        return
-    scope = scopes[nested_level]
-    list_len = len(scope.entities)
-    for i in range(list_len):
-        for j in range(list_len):
-            e1 = scope.entities[i]
-            e2 = scope.entities[j]
-            if e1.name == e2.name and e1.etype == e2.etype \
-                    and e1.name == name and e1.etype == etype:
-                return False
-    return True
-
-
-# Check if a variable entity named 'name' already exists
-# as a parameter entity.
-def var_is_param(name, nested_level):
-    if scopes[-1].nested_level < nested_level:
-        return
-    scope = scopes[nested_level]
-    list_len = len(scope.entities)
-    for i in range(list_len):
-        e = scope.entities[i]
-        if e.etype == "PARAMETER" and e.name == name:
-            return True
-    return False
+    def idtail(self):
+        if self.token.tktype == TokenType.LPAREN:
+            return self.actualpars()
 
 
-##############################################################
-#                                                            #
-#               Final code related functions                 #
-#                                                            #
-##############################################################
+    def relational_oper(self):
+        op = self.token.tkval
+        if self.token.tktype != TokenType.EQL and self.token.tktype != TokenType.LSS and \
+                self.token.tktype != TokenType.LEQ and self.token.tktype != TokenType.NEQ and \
+                self.token.tktype != TokenType.GEQ and self.token.tktype != TokenType.GTR:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected relational operator but found \'%s\' instead' % self.token.tkval)
+        self.token = self.lex()
+        return op
 
 
-# Load in register $t0 the address of the non-local variable 'v'.
-def gnvlcode(v):
-    try:
-        tmp_entity, elevel  = search_entity_by_name(v)
-    except:
-        perror_exit(7, 'Undeclared variable:', v)
-    if tmp_entity.etype == 'FUNCTION':
-        perror_exit(7, 'Undeclared variable:', v)
-    curr_nested_level   = scopes[-1].nested_level
-    outfile.write('    lw      $t0, -4($sp)\n')
-    n = curr_nested_level - elevel - 1
-    while  n > 0:
-        outfile.write('    lw      $t0, -4($t0)\n')
-        n -= 1
-    outfile.write('    addi    $t0, $t0, -%d\n' % tmp_entity.offset)
-
-
-# Load immediate or data 'v' from memory to register $t{r}.
-def loadvr(v, r):
-    if str(v).isdigit():
-        outfile.write('    li      $t%s, %d\n' % (r, v))
-    else:
-        try:
-            tmp_entity, elevel = search_entity_by_name(v)
-        except:
-            perror_exit(7, 'Undeclared variable:', v)
-        curr_nested_level  = scopes[-1].nested_level
-        if tmp_entity.etype == 'VARIABLE' and elevel == 0:
-            outfile.write('    lw      $t%s, -%d($s0)\n' % (r, tmp_entity.offset))
-        elif (tmp_entity.etype == 'VARIABLE' and \
-                elevel == curr_nested_level) or \
-                (tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'in' \
-                and elevel == curr_nested_level) or \
-                (tmp_entity.etype == 'TMPVAR'):
-            outfile.write('    lw      $t%s, -%d($sp)\n' % (r, tmp_entity.offset))
-        elif tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'inout' \
-                and elevel == curr_nested_level:
-            outfile.write('    lw      $t0, -%d($sp)\n' % tmp_entity.offset)
-            outfile.write('    lw      $t%s, 0($t0)\n' % r)
-        elif (tmp_entity.etype == 'VARIABLE' and \
-                elevel < curr_nested_level) or \
-                (tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'in' \
-                and elevel < curr_nested_level):
-            gnvlcode(v)
-            outfile.write('    lw      $t%s, 0($t0)\n' % r)
-        elif tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'inout' \
-                and elevel < curr_nested_level:
-            gnvlcode(v)
-            outfile.write('    lw      $t0, 0(%t0)\n')
-            outfile.write('    lw      $t%s, 0($t0)\n' % r)
-        else:
-            perror_exit(6, 'loadvr loads an immediate or data from memory'
-                        'to a register')
+    def add_oper(self):
+        op = self.token.tkval
+        if self.token.tktype != TokenType.PLUS and self.token.tktype != TokenType.MINUS:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'+\' or \'-\' but found \'%s\' instead' % self.token.tkval)
+        self.token = self.lex()
+        return op
 
 
-# Store the contents of register $t{r} to the memory allocated for variable 'v'.
-def storerv(r, v):
-    try:
-        tmp_entity, elevel = search_entity_by_name(v)
-    except:
-        perror_exit(7, 'Undeclared variable:', v)
-    curr_nested_level  = scopes[-1].nested_level
-    if tmp_entity.etype == 'VARIABLE' and elevel == 0:
-        outfile.write('    sw      $t%s, -%d($s0)\n' % (r, tmp_entity.offset))
-    elif (tmp_entity.etype == 'VARIABLE' and \
-            elevel == curr_nested_level) or \
-            (tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'in' \
-            and elevel == curr_nested_level) or \
-            (tmp_entity.etype == 'TMPVAR'):
-        outfile.write('    sw      $t%s, -%d($sp)\n' % (r, tmp_entity.offset))
-    elif tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'inout' \
-            and elevel == curr_nested_level:
-        outfile.write('    lw      $t0, -%d($sp)\n' % tmp_entity.offset)
-        outfile.write('    sw      $t%s, 0($t0)\n' % r)
-    elif (tmp_entity.etype == 'VARIABLE' and \
-            elevel < curr_nested_level) or \
-            (tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'in' \
-            and elevel < curr_nested_level):
-        gnvlcode(v)
-        outfile.write('    sw      $t%s, 0($t0)\n' % r)
-    elif tmp_entity.etype == 'PARAMETER' and tmp_entity.par_mode == 'inout' \
-            and elevel < curr_nested_level:
-        gnvlcode(v)
-        outfile.write('    lw      $t0, 0(%t0)\n')
-        outfile.write('    sw      $t%s, 0($t0)\n' % r)
-    else:
-        perror_exit(6, 'storerv stores the contents of a register to memory')
-
-
-# Generate the assembly code for quad 'quad'. 'block_name' is the name
-# of the block that is currently translated into final code.
-def gen_mips_asm(quad, block_name):
-    global actual_pars
-    if str(quad.label) == '0':
-        outfile.write(' ' * 70) # Will be later overwritten
-    outfile.write('\nL_' + str(quad.label) + ':   #' + quad.tofile() + '\n')
-    csc_relop = ('=', '<>', '<', '<=', '>', '>=')
-    asm_relop = ('beq', 'bne', 'blt', 'ble', 'bgt', 'bge')
-    csc_op    = ('+', '-', '*', '/')
-    asm_op    = ('add', 'sub', 'mul', 'div')
-    if quad.op == 'jump':
-        outfile.write('    j       L_%d\n' % quad.res)
-    elif quad.op in csc_relop:
-        relop = asm_relop[csc_relop.index(quad.op)]
-        loadvr(quad.arg1, '1')
-        loadvr(quad.arg2, '2')
-        outfile.write('    %s     $t1, $t2, L_%d\n' % (relop, quad.res))
-    elif quad.op == ':=':
-        loadvr(quad.arg1, '1')
-        storerv('1', quad.res)
-    elif quad.op in csc_op:
-        op = asm_op[csc_op.index(quad.op)]
-        loadvr(quad.arg1, '1')
-        loadvr(quad.arg2, '2')
-        outfile.write('    %s     $t1, $t1, $t2\n' % op)
-        storerv('1', quad.res)
-    elif quad.op == 'out':
-        loadvr(quad.arg1, '9')
-        outfile.write('    li      $v0, 1\n')
-        outfile.write('    add     $a0, $zero, $t9\n')
-        outfile.write('    syscall   # service code 1: print integer\n')
-        outfile.write('    la      $a0, newline\n')
-        outfile.write('    li      $v0, 4\n')
-        outfile.write('    syscall   # service code 4: print (a null terminated) string\n')
-    elif quad.op == 'retv':
-        loadvr(quad.arg1, '1')
-        outfile.write('    lw      $t0, -8($sp)\n')
-        outfile.write('    sw      $t1, 0($t0)\n')
-        # Actually return to caller; just like end_block case.
-        outfile.write('    lw      $ra, 0($sp)\n')
-        outfile.write('    jr      $ra\n')
-    elif quad.op == 'halt':
-        outfile.write('    li      $v0, 10   # service code 10: exit\n')
-        outfile.write('    syscall\n')
-    elif quad.op == 'par':
-        if block_name == mainprog_name:
-            caller_level = 0
-            framelength = main_programs_framelength
-        else:
-            caller_entity, caller_level = search_entity(block_name, 'FUNCTION')
-            framelength = caller_entity.framelength
-        if actual_pars == []:
-            outfile.write('    addi    $fp, $sp, -%d\n' % framelength)
-        actual_pars.append(quad)
-        param_offset = 12 + 4 * actual_pars.index(quad)
-        if quad.arg2 == 'CV':
-            loadvr(quad.arg1, '0')
-            outfile.write('    sw      $t0, -%d($fp)\n' % param_offset)
-        elif quad.arg2 == 'REF':
-            try:
-                var_entity, var_level = search_entity_by_name(quad.arg1)
-            except:
-                perror_exit(7, 'Undeclared variable:', quad.arg1)
-            if caller_level == var_level:
-                if var_entity.etype == 'VARIABLE' or \
-                        (var_entity.etype == 'PARAMETER' and \
-                        var_entity.par_mode == 'in'):
-                    outfile.write('    addi    $t0, $sp, -%s\n' % var_entity.offset)
-                    outfile.write('    sw      $t0, -%d($fp)\n' % param_offset)
-                elif var_entity.etype == 'PARAMETER' and \
-                        var_entity.par_mode == 'inout':
-                    outfile.write('    lw      $t0, -%d($sp)\n' % var_entity.offset)
-                    outfile.write('    sw      $t0, -%d($fp)\n' % param_offset)
-            else:
-                if var_entity.etype == 'VARIABLE' or \
-                        (var_entity.etype == 'PARAMETER' and \
-                        var_entity.par_mode == 'in'):
-                    gnvlcode(quad.arg1)
-                    outfile.write('    sw      $t0, -%d($fp)\n' % param_offset)
-                elif var_entity.etype == 'PARAMETER' and \
-                        var_entity.par_mode == 'inout':
-                    gnvlcode(quad.arg1)
-                    outfile.write('    lw      $t0, 0($t0)\n')
-                    outfile.write('    sw      $t0, -%d($fp)\n' % param_offset)
-        elif quad.arg2 == 'RET':
-            try:
-                var_entity, var_level = search_entity_by_name(quad.arg1)
-            except:
-                perror_exit(7, 'Undeclared variable:', quad.arg1)
-            outfile.write('    addi    $t0, $sp, -%d\n' % var_entity.offset)
-            outfile.write('    sw      $t0, -8($fp)\n')
-    elif quad.op == 'call':
-        if block_name == mainprog_name:
-            caller_level = 0
-            framelength = main_programs_framelength
-        else:
-            caller_entity, caller_level = search_entity(block_name, 'FUNCTION')
-            framelength = caller_entity.framelength
-        try:
-            callee_entity, callee_level = search_entity(quad.arg1, 'FUNCTION')
-        except:
-            perror_exit(7, 'Undefined function/procedure:', quad.arg1)
-        check_subprog_args(callee_entity.name)
-        if caller_level == callee_level:
-            outfile.write('    lw      $t0, -4($sp)\n')
-            outfile.write('    sw      $t0, -4($fp)\n')
-        else:
-            outfile.write('    sw      $sp, -4($fp)\n')
-        outfile.write('    addi    $sp, $sp, -%d\n' % framelength)
-        outfile.write('    jal     L_%s\n' % str(callee_entity.start_quad))
-        outfile.write('    addi    $sp, $sp, %d\n' % framelength)
-    elif quad.op == 'begin_block':
-        outfile.write('    sw      $ra, 0($sp)\n')
-        if block_name == mainprog_name:
-            outfile.seek(0,0)   # Go to the beginning of the output file
-            outfile.write('\n')
-            outfile.write('    .globl L_%d\n' % quad.label)
-            outfile.write('    .text\n\n')
-            outfile.write('    j       L_%d   # main program\n' % quad.label)
-            outfile.seek(0,2)   # Go to the end of the output file
-            #outfile.write('    addi    $sp, $sp, %d\n' % main_programs_framelength)
-            outfile.write('    move    $s0, $sp\n')
-    elif quad.op == 'end_block':
-        if block_name == mainprog_name:
-            outfile.write('    j       L_%d\n' % halt_label)
-            # Hack for printing newline character
-            outfile.write('\n###########################\n\n')
-            outfile.write('    .data\n\n')
-            outfile.write('newline:  .asciiz    "\\n"\n\n')
-        else:
-            outfile.write('    lw      $ra, 0($sp)\n')
-            outfile.write('    jr      $ra\n')
-
-
-# Check if actual parameters of subprogram 'name'
-# are of the same type as typical parameters.
-def check_subprog_args(name):
-    global actual_pars
-    entity, level = search_entity_by_name(name)
-    if entity.ret_type == 'int':
-        actual_pars.pop() # pop parameter of type 'RET'
-    if len(entity.args) != len(actual_pars):
-        perror_exit(7, '%s: Missmatching subprogram argument number' %
-            name)
-    #print('\ncheck')
-    for arg in entity.args:
-        quad = actual_pars.pop(0)
-        #print(arg.par_mode, quad.arg2, arg, quad)
-        if not (arg.par_mode == quad.arg2):
-            if arg.par_mode == 'CV':
-                ptype = 'int'
-            else:
-                ptype = 'int *'
-            perror_exit(7,'%s: Expected parameter \'%s\' to be of'
-                ' type "%s"' % (name, quad.arg1, ptype))
+    def mul_oper(self):
+        op = self.token.tkval
+        if self.token.tktype != TokenType.TIMES and self.token.tktype != TokenType.SLASH:
+            self.perror_line_exit(3, self.token.tkl, self.token.tkc,
+                'Expected \'*\' or \'/\' but found \'%s\' instead' % self.token.tkval)
+        self.token = self.lex()
+        return op
+
+
+    def optional_sign(self):
+        if self.token.tktype == TokenType.PLUS or self.token.tktype == TokenType.MINUS:
+            return self.add_oper()
 
 
 ##############################################################
 #                                                            #
-#                 Parser related functions                   #
+#                 Peephole optimization rules                #
 #                                                            #
 ##############################################################
 
 
-def parser():
-    global token
-    token = lex()
-    program()
-    # At this point syntax analysis has succeeded
-    # but we should check for stray tokens.
-    if token.tktype != TokenType.EOF:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'EOF\' but found \'%s\' instead' % token.tkval)
-    generate_int_code_file()
-    if have_subprog == False:
-        generate_c_code_file()
-    else:
-        pwarn('Nested functions are defined! Transformation of intermediate\n' \
-            + '          code to ANSI C equivalent cannot take place!')
-        ceq_file.close()
-        os.remove(ceq_file.name)
-
-
-# The following functions implement the syntax and semantic rules of CiScal grammar
-# rev.3 (as of March 3, 2017), including any additional specifications published at
-# a later time (as of April 26, 2017). For this reason, no further documentation is
-# necessary other than the one found in ciscal-grammar.pdf and the corresponding
-# specifications documents.
-
-
-def program():
-    global token, mainprog_name
-    if token.tktype == TokenType.PROGRAMSYM:
-        token = lex()
-        if token.tktype == TokenType.IDENT:
-            mainprog_name = name = token.tkval
-            token = lex()
-            scopes.append(Scope())
-            block(name)
-        else:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected program name but found \'%s\' instead' % token.tkval)
-    else:
-        perror_exit(3, 'Missing \'program\' keyword')
-
-
-def block(name):
-    global token, scopes, halt_label
-    #print("ENTERING ", name)
-    #print_scopes()
-    if token.tktype == TokenType.LBRACE:
-        token = lex()
-        declarations()
-        subprograms()
-        block_start_quad = update_func_entity_quad(name)
-        gen_quad('begin_block', name)
-        sequence()
-        if token.tktype != TokenType.RBRACE:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected block end (\'}\') but found \'%s\' instead' % token.tkval)
-        token = lex()
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected block start (\'{\') but found \'%s\' instead' % token.tkval)
-    if name == mainprog_name:
-        halt_label = next_quad()
-        gen_quad('halt')
-    gen_quad('end_block', name)
-    update_func_entity_framelen(name, scopes[-1].tmp_offset)
-    #print("LEAVING ", name)
-    #print_scopes()
-    for quad in quad_code[block_start_quad:]:
-        gen_mips_asm(quad, name)
-    scopes.pop()
-
-
-def declarations():
-    global token
-    if token.tktype == TokenType.DECLARESYM:
-        token = lex()
-        varlist()
-        if token.tktype != TokenType.ENDDECLSYM:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \'enddeclare\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-
-
-def varlist():
-    global token
-    if token.tktype == TokenType.IDENT:
-        add_var_entity(token.tkval)
-        token = lex()
-        while token.tktype == TokenType.COMMA:
-            token = lex()
-            if token.tktype != TokenType.IDENT:
-                perror_line_exit(3, token.tkl, token.tkc,
-                    'Expected variable declaration but found \'%s\' instead'
-                    % token.tkval)
-            add_var_entity(token.tkval)
-            token = lex()
-
-
-def subprograms():
-    global token, have_return, in_function, have_subprog
-    while token.tktype == TokenType.PROCSYM or token.tktype == TokenType.FUNCSYM:
-        in_function.append(False)
-        have_return.append(False)
-        have_subprog = True
-        if token.tktype == TokenType.FUNCSYM:
-            in_function[-1] = True
-        token = lex()
-        func()
-        if in_function.pop() == True:
-            if have_return.pop() == False:
-                perror_line_exit(4, token.tkl, token.tkc,
-                    'Expected return statement in function body')
-        else:
-            have_return.pop()
-
-
-def func():
-    global token, scopes
-    add_new_scope()
-    if token.tktype == TokenType.IDENT:
-        name = token.tkval
-        token = lex()
-        add_func_entity(name)
-        funcbody(name)
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected procedure/function name but found \'%s\' instead' % token.tkval)
+# A rule is a function of (instrs, i, targets), where 'instrs' is a list
+# of Instr objects and 'targets' the set of the labels that some jump,
+# branch or call refers to. A rule that matches at instruction instrs[i]
+# returns a (start, stop, replacement) tuple, where 'replacement' is the
+# list of Instr objects that replaces instrs[start:stop] and start <= i.
+# Otherwise it returns None. 'instrs' is only a window of the code around
+# the current instruction: peep_lookbehind instructions before it and
+# peep_lookahead ones starting from it. A label that no jump refers to
+# is only reached from the instruction before it, so rules see through
+# it.
+# Registers $t0-$t2 and $t9 only carry values within the code of a
+# single quad, so they are never live at jump targets.
+
+branch_ops      = ('beq', 'bne', 'blt', 'ble', 'bgt', 'bge',
+                   'beqz', 'bnez', 'bltz', 'blez', 'bgtz', 'bgez')
+scratch_regs    = ('$t0', '$t1', '$t2', '$t9')
+peep_lookbehind = 16
+peep_lookahead  = 40
+
+
+# Return an Instr object for text line 'line'.
+def parse_instr(line):
+    fields = line.split(None, 1)
+    if fields == []:
+        return Instr(None, [''], line)
+    if fields[0].endswith(':'):
+        return Instr(None, [fields[0][:-1]], line)
+    args = fields[1].split('#', 1)[0].strip() if len(fields) > 1 else ''
+    if args == '':
+        return Instr(fields[0], [], line)
+    return Instr(fields[0], args.replace(' ', '').split(','), line)
+
+
+# Return the register that instruction 'instr' writes, or None.
+def written_reg(instr):
+    if instr.op == None or instr.op in branch_ops or \
+            instr.op in ('sw', 'j', 'jr', 'jal', 'syscall'):
+        return None
+    return instr.args[0]
+
+
+# True if instruction 'instr' reads register 'reg' (directly, or as the
+# base register of a memory operand).
+def reads_reg(instr, reg):
+    args = instr.args[1:] if written_reg(instr) != None else instr.args
+    return any(reg in arg for arg in args)
+
+
+# Return the index of the first instruction after instrs[i], seeing
+# through labels that are not in 'targets', or None.
+def next_instr(instrs, i, targets):
+    for j in range(i + 1, len(instrs)):
+        if instrs[j].op != None:
+            return j
+        if instrs[j].args[0] in targets:
+            return None
+    return None
+
+
+# True if scratch register 'reg' is dead after instrs[i].
+def dead_after(instrs, i, reg, targets):
+    for instr in instrs[i + 1:]:
+        if instr.op == None:
+            if instr.args[0] in targets:
+                return True
+        elif reads_reg(instr, reg):
+            return False
+        elif written_reg(instr) == reg or instr.op in ('j', 'jr', 'jal'):
+            return True
+    return False
 
 
-def funcbody(name):
-    formalpars(name)
-    block(name)
+# 'sw R, M' followed by 'lw R2, M': R already holds the value of M.
+def peep_store_load(instrs, i, targets):
+    store = instrs[i]
+    if store.op != 'sw':
+        return None
+    j = next_instr(instrs, i, targets)
+    if j == None or instrs[j].op != 'lw' or instrs[j].args[1] != store.args[1]:
+        return None
+    if instrs[j].args[0] == store.args[0]:
+        return i, j + 1, instrs[i:j]
+    return i, j + 1, instrs[i:j] + [Instr('move', [instrs[j].args[0], store.args[0]])]
 
 
-def formalpars(func_name):
-    global token
-    if token.tktype == TokenType.LPAREN:
-        token = lex()
-        if token.tktype == TokenType.INSYM or token.tktype == TokenType.INOUTSYM:
-            formalparlist(func_name)
-        if token.tktype != TokenType.RPAREN:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \')\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'(\' but found \'%s\' instead' % token.tkval)
-
-
-def formalparlist(func_name):
-    global token
-    formalparitem(func_name)
-    while token.tktype == TokenType.COMMA:
-        token = lex()
-        if token.tktype != TokenType.INSYM and token.tktype != TokenType.INOUTSYM:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected formal parameter declaration but found \'%s\' instead'
-                % token.tkval)
-        formalparitem(func_name)
-
-
-def formalparitem(func_name):
-    global token, scopes
-    if token.tktype == TokenType.INSYM or token.tktype == TokenType.INOUTSYM:
-        par_mode = token.tkval
-        token = lex()
-        if token.tktype != TokenType.IDENT:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected formal parameter name but found \'%s\' instead'
-                % token.tkval)
-        par_name = token.tkval
-        add_func_arg(func_name, par_mode)
-        add_param_entity(par_name, par_mode)
-        token = lex()
-
-
-def sequence():
-    global token
-    statement()
-    while token.tktype == TokenType.SEMICOLON:
-        token = lex()
-        statement();
-
-
-def brackets_seq():
-    global token
-    if token.tktype == TokenType.LBRACE:
-        token = lex()
-        sequence()
-        if token.tktype != TokenType.RBRACE:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected end of bracket sequence (\'}\') but found \'%s\' instead'
-                % token.tkval)
-        token = lex()
+# 'j L' or a conditional branch to L, right before label L.
+def peep_jump_to_next(instrs, i, targets):
+    jump = instrs[i]
+    if jump.op != 'j' and jump.op not in branch_ops:
+        return None
+    for j in range(i + 1, len(instrs)):
+        if instrs[j].op != None:
+            return None
+        if instrs[j].args[0] == jump.args[-1]:
+            return i, i + 1, []
+    return None
+
+
+# 'li R, C' while R already holds C: the last instruction that wrote R,
+# among the ones since the last jump target, is 'li R, C' too.
+def peep_redundant_li(instrs, i, targets):
+    load = instrs[i]
+    if load.op != 'li':
+        return None
+    for instr in reversed(instrs[:i]):
+        if instr.op == None:
+            if instr.args[0] in targets:
+                return None
+        elif instr.op in ('jal', 'syscall'):
+            return None
+        elif written_reg(instr) == load.args[0]:
+            if instr.op == 'li' and instr.args[1] == load.args[1]:
+                return i, i + 1, []
+            return None
+    return None
+
+
+# 'add D, $zero, S' or 'move D, S', where scratch register S was just
+# written and is dead afterwards: write D instead, e.g. the value to
+# print straight into $a0.
+def peep_forward_copy(instrs, i, targets):
+    copy = instrs[i]
+    if copy.op == 'add' and copy.args[1] == '$zero':
+        dest, src = copy.args[0], copy.args[2]
+    elif copy.op == 'move':
+        dest, src = copy.args
     else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected start of bracket sequence (\'{\') but found \'%s\' instead'
-            % token.tkval)
+        return None
+    if src not in scratch_regs or not dead_after(instrs, i, src, targets):
+        return None
+    for j in range(i - 1, max(i - 4, -1), -1):
+        instr = instrs[j]
+        if instr.op == None or instr.op in branch_ops or instr.op in ('jal', 'syscall'):
+            return None
+        if written_reg(instr) == src:
+            if reads_reg(instr, src) or reads_reg(instr, dest):
+                return None
+            return j, i + 1, [Instr(instr.op, [dest] + instr.args[1:])] + instrs[j + 1:i]
+        if reads_reg(instr, src) or reads_reg(instr, dest) or written_reg(instr) == dest:
+            return None
+    return None
+
+
+# The peephole optimization rules, by name, along with the instructions
+# they match at, in the order they are tried.
+peephole_rules = (
+    ('store-load',    ('sw',),               peep_store_load),
+    ('redundant-li',  ('li',),               peep_redundant_li),
+    ('forward-copy',  ('add', 'move'),       peep_forward_copy),
+    ('jump-to-next',  ('j',) + branch_ops,   peep_jump_to_next),
+)
 
 
-def brack_or_stat():
-    global token
-    if token.tktype == TokenType.LBRACE:
-        brackets_seq()
-    else:
-        statement()
-        if token.tktype != TokenType.SEMICOLON:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \';\' after single or empty statement but found \'%s\' instead'
-                % token.tkval)
-        token = lex()
-
-
-def statement():
-    global token, have_return
-    if token.tktype == TokenType.IDENT:
-        lhand = token.tkval
-        token = lex()
-        rhand = assignment_stat()
-        gen_quad(':=', rhand, '_', lhand)
-    elif token.tktype == TokenType.IFSYM:
-        token = lex()
-        if_stat()
-    elif token.tktype == TokenType.DOSYM:
-        token = lex()
-        do_while_stat()
-    elif token.tktype == TokenType.WHILESYM:
-        token = lex()
-        while_stat()
-    elif token.tktype == TokenType.SELECTSYM:
-        token = lex()
-        select_stat()
-    elif token.tktype == TokenType.EXITSYM:
-        if in_dowhile == []:
-            perror_line_exit(4, token.tkl, token.tkc,
-                'Encountered \'exit\' outside of a do-while loop')
-        e_list = make_list(next_quad())
-        gen_quad('jump')
-        exit_dowhile[-1] = e_list
-        token = lex()
-        # No need to define exit_stat();
-        # only to consume token.
-    elif token.tktype == TokenType.RETURNSYM:
-        if in_function == [] or in_function[-1] == False:
-            perror_line_exit(4, token.tkl, token.tkc,
-                'Encountered \'return\' outside of function definition')
-        else:
-            have_return[-1] = True
-        token = lex()
-        return_stat()
-    elif token.tktype == TokenType.PRINTSYM:
-        token = lex()
-        print_stat()
-    elif token.tktype == TokenType.CALLSYM:
-        token = lex()
-        call_stat()
-
-
-def assignment_stat():
-    global token
-    if token.tktype == TokenType.BECOMES:
-        token = lex()
-        return expression()
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \':=\' but found \'%s\' instead' % token.tkval)
-
-
-def if_stat():
-    global token
-    if token.tktype == TokenType.LPAREN:
-        token = lex()
-        (b_true, b_false) = condition()
-        if token.tktype != TokenType.RPAREN:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \')\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-        backpatch(b_true, next_quad())
-        brack_or_stat()
-        skip_list = make_list(next_quad())
-        gen_quad('jump')
-        backpatch(b_false, next_quad())
-        elsepart()
-        backpatch(skip_list, next_quad())
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'(\' after \'if\' but found \'%s\' instead' % token.tkval)
-
-
-def elsepart():
-    global token
-    if token.tktype == TokenType.ELSESYM:
-        token = lex()
-        brack_or_stat()
-
-
-def while_stat():
-    global token
-    b_quad = next_quad()
-    if token.tktype == TokenType.LPAREN:
-        token = lex()
-        (b_true, b_false) = condition()
-        if token.tktype != TokenType.RPAREN:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \')\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-        backpatch(b_true, next_quad())
-        brack_or_stat()
-        gen_quad('jump','_','_',b_quad)
-        backpatch(b_false, next_quad())
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'(\' after \'while\' but found \'%s\' instead'
-            % token.tkval)
-
-
-def select_stat():
-    global token
-    if token.tktype == TokenType.LPAREN:
-        token = lex()
-        if token.tktype == TokenType.IDENT:
-            id = token.tkval
-            token = lex()
-            if token.tktype == TokenType.RPAREN:
-                token = lex()
-                const = 1
-                exit_list = empty_list()
-                while token.tktype == TokenType.NUMBER:
-                    number = int(token.tkval)
-                    if number != const:
-                        perror_line_exit(3, token.tkl, token.tkc,
-                            'Expected \'%d\' as case constant but found \'%s\' instead'
-                            % (const,token.tkval))
-                    const += 1
-                    token = lex()
-                    if token.tktype == TokenType.COLON:
-                        true_list = make_list(next_quad())
-                        gen_quad('=', id, number)
-                        false_list = make_list(next_quad())
-                        gen_quad('jump')
-                        backpatch(true_list, next_quad())
-                        token = lex()
-                        brack_or_stat()
-                        tmp_list = make_list(next_quad())
-                        gen_quad('jump')
-                        exit_list = merge(exit_list, tmp_list)
-                        backpatch(false_list, next_quad())
-                    else:
-                        perror_line_exit(3, token.tkl, token.tkc,
-                            'Expected \':\' after case constant but found \'%s\' instead'
-                            % token.tkval)
-                if token.tktype == TokenType.DEFAULTSYM:
-                    token = lex()
-                    if token.tktype == TokenType.COLON:
-                        token = lex()
-                        brack_or_stat()
-                        backpatch(exit_list, next_quad())
-                    else:
-                        perror_line_exit(3, token.tkl, token.tkc,
-                            'Expected \':\' after default keyword but found \'%s\' instead'
-                            % token.tkval)
-                else:
-                    perror_line_exit(3, token.tkl, token.tkc,
-                        'Expected \'default\' case but found \'%s\' instead'
-                        % token.tkval)
-            else:
-                perror_line_exit(3, token.tkl, token.tkc,
-                    'Expected \')\' but found \'%s\' instead'
-                    % token.tkval)
-        else:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected variable identifier but found \'%s\' instead'
-                % token.tkval)
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'(\' after \'select\' but found \'%s\' instead'
-            % token.tkval)
-
-
-def do_while_stat():
-    global token, in_dowhile, exit_dowhile
-    in_dowhile.append(True)
-    exit_dowhile.append(None)
-    s_quad = next_quad()
-    brack_or_stat()
-    if token.tktype == TokenType.WHILESYM:
-        token = lex()
-        if token.tktype == TokenType.LPAREN:
-            token = lex()
-            (c_true, c_false) = condition()
-            if token.tktype != TokenType.RPAREN:
-                perror_line_exit(3, token.tkl, token.tkc,
-                    'Expected \')\' but found \'%s\' instead' % token.tkval)
-            backpatch(c_true, s_quad)
-            e_quad = next_quad()
-            backpatch(c_false, e_quad)
-            token = lex()
-        else:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \'(\' after \'while\' but found \'%s\' instead'
-                % token.tkval)
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'while\' token but found \'%s\' instead' % token.tkval)
-    if exit_dowhile[-1] != None:
-        backpatch(exit_dowhile[-1], e_quad)
-    exit_dowhile.pop()
-    in_dowhile.pop()
-
-
-def return_stat():
-    global token
-    if token.tktype == TokenType.LPAREN:
-        token = lex()
-        exp   = expression()
-        gen_quad('retv', exp)
-        if token.tktype != TokenType.RPAREN:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \')\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'(\' after \'return\' but found \'%s\' instead'
-            % token.tkval)
-
-
-def print_stat():
-    global token
-    if token.tktype == TokenType.LPAREN:
-        token = lex()
-        exp   = expression()
-        gen_quad('out', exp)
-        if token.tktype != TokenType.RPAREN:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \')\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'(\' after \'print\' but found \'%s\' instead'
-            % token.tkval)
+##############################################################
+#                                                            #
+#                       Compile cache                        #
+#                                                            #
+##############################################################
 
 
-def call_stat():
-    global token
-    if token.tktype == TokenType.IDENT:
-        procid = token.tkval
-        token  = lex()
-        actualpars()
+# An on-disk cache of Artifacts objects, used to skip compilation of
+# unchanged programs. Entries are content-addressed: the key is a hash of
+# the source, the compiler version and the options, so they never need
+# to be invalidated. Each entry is a JSON file in a subdirectory named
+# after the first two digits of the key. Hits update the entry's mtime,
+# and evict() removes the least recently used entries until the cache
+# fits in 'max_size' bytes.
+#   directory   : cache directory (created on demand)
+#   max_size    : maximum size of the cache in bytes
+#   hits        : number of cache hits
+#   misses      : number of cache misses (compiled programs)
+#   bytes_saved : size of the artifacts restored from the cache
+class CompileCache():
+    def __init__(self, directory, max_size=100 * 2**20):
+        self.directory, self.max_size = directory, max_size
+        self.hits = self.misses = self.bytes_saved = 0
+
+    # Return the cache key of program 'source' compiled with 'options'.
+    def key(self, source, options):
+        digest = hashlib.sha256()
+        for part in (__version__, repr(options), source):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    # Return the path of the entry cached under 'key'.
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    # Return the Artifacts object cached under 'key' or None.
+    # A corrupted entry is treated as a miss.
+    def get(self, key):
+        path = self.path(key)
         try:
-            proce, procl = search_entity_by_name(procid)
-        except:
-            perror_line_exit(7, token.tkl, token.tkc,
-            'Undefined procedure \'%s\'' % procid)
-        gen_quad('call', procid)
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected procedure name but found \'%s\' instead' % token.tkval)
-
-
-def actualpars():
-    global token
-    if token.tktype == TokenType.LPAREN:
-        token = lex()
-        if token.tktype == TokenType.INSYM or token.tktype == TokenType.INOUTSYM:
-            actualparlist()
-        if token.tktype != TokenType.RPAREN:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \')\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-        return True
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'(\' after procedure/function name but found \'%s\' instead'
-            % token.tkval)
-
-
-def actualparlist():
-    global token
-    actualparitem()
-    while token.tktype == TokenType.COMMA:
-        token = lex()
-        actualparitem()
-
-
-def actualparitem():
-    global token
-    if token.tktype == TokenType.INSYM:
-        token = lex()
-        exp   = expression()
-        gen_quad('par', exp, 'CV')
-    elif token.tktype == TokenType.INOUTSYM:
-        token = lex()
-        parid = token.tkval
-        if token.tktype != TokenType.IDENT:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected variable identifier but found \'%s\' instead' % token.tkval)
-        token = lex()
-        gen_quad('par', parid, 'REF')
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected parameter type but found \'%s\' instead' % token.tkval)
-
-
-def condition():
-    global token
-    (b_true, b_false) = (q1_true, q1_false) = boolterm()
-    while token.tktype == TokenType.ORSYM:
-        backpatch(b_false, next_quad())
-        token = lex()
-        (q2_true, q2_false) = boolterm()
-        b_true  = merge(b_true, q2_true)
-        b_false = q2_false
-    return (b_true, b_false)
-
-
-def boolterm():
-    global token
-    (q_true, q_false) = (r1_true, r1_false) = boolfactor()
-    while token.tktype == TokenType.ANDSYM:
-        backpatch(q_true, next_quad())
-        token = lex()
-        (r2_true, r2_false) = boolfactor()
-        q_false = merge(q_false, r2_false)
-        q_true  = r2_true
-    return (q_true, q_false)
-
-
-def boolfactor():
-    global token
-    if token.tktype == TokenType.NOTSYM:
-        token = lex()
-        if token.tktype == TokenType.LBRACKET:
-            token = lex()
-            retval = condition()
-            retval = retval[::-1] # reverse lists
-            if token.tktype != TokenType.RBRACKET:
-                perror_line_exit(3, token.tkl, token.tkc,
-                    'Expected \']\' but found \'%s\' instead' % token.tkval)
-            token = lex()
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+            return Artifacts(entry['interm'], entry['cequiv'], entry['asm'],
+                entry['diagnostics'], entry['dot'], entry['peephole'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    # Cache 'artifacts' under 'key'. The entry is written to a temporary
+    # file and then renamed, so that concurrent compilations (processes
+    # or threads) never see partial entries. Failures are ignored; the
+    # cache is optional.
+    def put(self, key, artifacts):
+        path = self.path(key)
+        tmppath = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmppath, 'w', encoding='utf-8') as f:
+                json.dump({'interm': artifacts.interm, 'cequiv': artifacts.cequiv,
+                    'asm': artifacts.asm, 'diagnostics': artifacts.diagnostics,
+                    'dot': artifacts.dot, 'peephole': artifacts.peephole}, f)
+            os.replace(tmppath, path)
+        except OSError:
+            pass
+
+    # Update the statistics with the outcome of a compilation: 'restored'
+    # is the number of bytes restored from the cache, or None on a miss.
+    def record(self, restored):
+        if restored == None:
+            self.misses += 1
         else:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \'[\' after \'not\' but found \'%s\' instead'
-                % token.tkval)
-    elif token.tktype == TokenType.LBRACKET:
-        token = lex()
-        retval = condition()
-        if token.tktype != TokenType.RBRACKET:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \']\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-    else:
-        exp1   = expression()
-        op     = relational_oper()
-        exp2   = expression()
-        r_true = make_list(next_quad())
-        gen_quad(op, exp1, exp2)
-        r_false = make_list(next_quad())
-        gen_quad('jump')
-        retval = (r_true, r_false)
-    return retval
-
-
-def expression():
-    opsign = optional_sign()
-    term1  = term()
-    # unary minus
-    if opsign != None:
-        signtmp = new_temp()
-        gen_quad('-', 0, term1, signtmp)
-        term1 = signtmp
-    while token.tktype == TokenType.PLUS or token.tktype == TokenType.MINUS:
-        op     = add_oper()
-        term2  = term()
-        tmpvar = new_temp()
-        gen_quad(op, term1, term2, tmpvar)
-        term1 = tmpvar
-    return term1
-
-
-def term():
-    factor1 = factor()
-    while token.tktype == TokenType.TIMES or token.tktype == TokenType.SLASH:
-        op      = mul_oper()
-        factor2 = factor()
-        tmpvar  = new_temp()
-        gen_quad(op, factor1, factor2, tmpvar)
-        factor1 = tmpvar
-    return factor1
-
-
-def factor():
-    global token
-    if token.tktype == TokenType.NUMBER or token.tktype == TokenType.PLUS or \
-            token.tktype == TokenType.MINUS:
-        retval = number_const()
-    elif token.tktype == TokenType.LPAREN:
-        token  = lex()
-        retval = expression()
-        if token.tktype != TokenType.RPAREN:
-            perror_line_exit(3, token.tkl, token.tkc,
-                'Expected \')\' but found \'%s\' instead' % token.tkval)
-        token = lex()
-    elif token.tktype == TokenType.IDENT:
-        retval = token.tkval
-        token  = lex()
-        tail   = idtail()
-        if tail != None:
-            funcret = new_temp()
-            gen_quad('par', funcret, 'RET')
-            try:
-                funce, funcl = search_entity_by_name(retval)
-            except:
-                perror_line_exit(7, token.tkl, token.tkc,
-                'Undefined function \'%s\'' % retval)
-            gen_quad('call', retval)
-            retval = funcret
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected factor but found \'%s\' instead' % token.tkval)
-    return retval
-
-
-# Custom function that returns the numeric value
-# of a constant. Optional sign is taken into account.
-def number_const():
-    global token
-    sign = '+'
-    if token.tktype == TokenType.PLUS or token.tktype == TokenType.MINUS:
-        sign = token.tkval
-        token = lex()
-    if token.tktype == TokenType.NUMBER:
-        numval = int(''.join((sign, token.tkval)))
-        # MIN_INT= -32768, MAX_INT= 32767
-        if numval < -32768 or numval > 32767:
-            perror_line_exit(3, token.tkl, token.tkc,
-               'Number constants should be between -32768 and 32767')
-    else:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected number constant but found \'%s\' instead' % token.tkval)
-    token = lex()
-    return numval
-
-
-def idtail():
-    if token.tktype == TokenType.LPAREN:
-        return actualpars()
-
-
-def relational_oper():
-    global token
-    op = token.tkval
-    if token.tktype != TokenType.EQL and token.tktype != TokenType.LSS and \
-            token.tktype != TokenType.LEQ and token.tktype != TokenType.NEQ and \
-            token.tktype != TokenType.GEQ and token.tktype != TokenType.GTR:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected relational operator but found \'%s\' instead' % token.tkval)
-    token = lex()
-    return op
+            self.hits += 1
+            self.bytes_saved += restored
 
+    # Return a list of (mtime, size, path) tuples, one per cache entry.
+    def entries(self):
+        entries = list()
+        try:
+            subdirs = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for subdir in subdirs:
+            try:
+                with os.scandir(os.path.join(self.directory, subdir)) as it:
+                    for entry in it:
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+            except OSError:
+                continue
+        return entries
+
+    # Remove the least recently used entries until the cache fits in
+    # 'max_size' bytes.
+    def evict(self):
+        entries = self.entries()
+        size = sum(entry[1] for entry in entries)
+        entries.sort()
+        for mtime, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+            except OSError:
+                pass
+
+    # Print the cache statistics.
+    def print_stats(self):
+        entries = self.entries()
+        print('cache: %d hit(s), %d miss(es), %d bytes saved; %d entries, '
+            '%d bytes in %s' % (self.hits, self.misses, self.bytes_saved,
+            len(entries), sum(entry[1] for entry in entries), self.directory))
+
+
+# Compile program 'source' (see compile()), looking it up in 'cache'
+# first, if given. Return an (artifacts, restored) tuple, where
+# 'restored' is the number of bytes restored from the cache or None.
+# Raise CompileError on failure.
+def cached_compile(source, filename='<input>', lexer='fsm', emit=default_emit,
+        optlevel=0, cache=None):
+    if cache == None:
+        return compile(source, filename, lexer, emit, optlevel), None
+    key = cache.key(source, (lexer, emit, optlevel))
+    artifacts = cache.get(key)
+    if artifacts == None:
+        artifacts = compile(source, filename, lexer, emit, optlevel)
+        cache.put(key, artifacts)
+        return artifacts, None
+    restored = 0
+    for text in (artifacts.interm, artifacts.cequiv, artifacts.asm, artifacts.dot):
+        if text != None:
+            restored += len(text)
+    return artifacts, restored
 
-def add_oper():
-    global token
-    op = token.tkval
-    if token.tktype != TokenType.PLUS and token.tktype != TokenType.MINUS:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'+\' or \'-\' but found \'%s\' instead' % token.tkval)
-    token = lex()
-    return op
 
+##############################################################
+#                                                            #
+#                      Compile server                        #
+#                                                            #
+##############################################################
 
-def mul_oper():
-    global token
-    op = token.tkval
-    if token.tktype != TokenType.TIMES and token.tktype != TokenType.SLASH:
-        perror_line_exit(3, token.tkl, token.tkc,
-            'Expected \'*\' or \'/\' but found \'%s\' instead' % token.tkval)
-    token = lex()
-    return op
 
+# The compile server keeps a warm compiler resident on a Unix socket,
+# so that clients do not pay for interpreter start-up and module
+# initialization on every compilation. A client connects, sends one
+# JSON request and shuts down its side of the connection; the server
+# replies with one JSON response and closes the connection.
+#   request  : {"filename": name used in diagnostics,
+#               "source": program text, or "path": file to read,
+#               "lexer": "fsm" or "table" (optional),
+#               "emit": list of artifact_kinds (optional),
+#               "optlevel": optimization level (optional)}
+#   response : {"ec": exit code, "diagnostics": warnings and errors,
+#               "interm", "cequiv", "asm", "dot": artifacts (if ec is 0),
+#               "peephole": peephole optimization rule hits (if ec is 0),
+#               "restored": bytes restored from the cache or null,
+#               "latency": server side latency in seconds}
+
+
+# Return all the data received from 'sock' until EOF.
+def recv_all(sock):
+    chunks = list()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+# Return the response to compilation 'request' (see above). Only errors
+# in the request itself make an invalid request; the compiler reports
+# everything else just like compile_file() does, and unexpected errors
+# are logged to stderr as well.
+def serve_request(request, cache):
+    errfile = io.StringIO()
+    try:
+        filename = request.get('filename', '<input>')
+        lexer    = request.get('lexer', 'fsm')
+        emit     = request.get('emit', default_emit)
+        optlevel = request.get('optlevel', 0)
+        if not isinstance(filename, str):
+            raise TypeError('filename')
+        if lexer not in ('fsm', 'table'):
+            perror('%s: unknown lexical analyzer engine' % lexer, file=errfile)
+            return {'ec': 1, 'diagnostics': errfile.getvalue()}
+        for kind in emit:
+            if kind not in artifact_kinds:
+                perror('%s: unknown artifact' % kind, file=errfile)
+                return {'ec': 1, 'diagnostics': errfile.getvalue()}
+        emit = tuple(kind for kind in artifact_kinds if kind in emit)
+        if optlevel not in optlevels:
+            perror('%s: unknown optimization level' % optlevel, file=errfile)
+            return {'ec': 1, 'diagnostics': errfile.getvalue()}
+        if 'source' in request:
+            source = request['source']
+        else:
+            with open(request['path'], 'r', encoding='utf-8') as f:
+                source = f.read()
+        if not isinstance(source, str):
+            raise TypeError('source')
+    except OSError as oserr:
+        perror_oserr(oserr, file=errfile)
+        return {'ec': oserr.errno, 'diagnostics': errfile.getvalue()}
+    except (AttributeError, KeyError, TypeError):
+        perror('invalid request', file=errfile)
+        return {'ec': 1, 'diagnostics': errfile.getvalue()}
+    try:
+        artifacts, restored = cached_compile(source, filename, lexer, emit, optlevel,
+            cache)
+    except CompileError as err:
+        return {'ec': err.ec, 'diagnostics': err.diagnostics}
+    except OSError as oserr:
+        perror_oserr(oserr, file=errfile)
+        return {'ec': oserr.errno, 'diagnostics': errfile.getvalue()}
+    except Exception as exc:
+        perror_internal(exc, filename, file=errfile)
+        sys.stderr.write(errfile.getvalue())
+        return {'ec': 1, 'diagnostics': errfile.getvalue()}
+    return {'ec': 0, 'diagnostics': artifacts.diagnostics, 'interm': artifacts.interm,
+        'cequiv': artifacts.cequiv, 'asm': artifacts.asm, 'dot': artifacts.dot,
+        'peephole': artifacts.peephole, 'restored': restored}
+
+
+# Handle the compilation request of connection 'conn' and log its
+# latency to stderr. Runs in a worker thread of the server; every
+# request gets its own Compiler object, so no state is shared.
+def serve_connection(conn, cache, lock):
+    start = time.perf_counter()
+    with conn:
+        try:
+            request = json.loads(recv_all(conn).decode('utf-8'))
+        except (OSError, ValueError):
+            request = None
+        response = serve_request(request, cache)
+        response['latency'] = time.perf_counter() - start
+        try:
+            conn.sendall(json.dumps(response).encode('utf-8'))
+        except OSError:
+            pass
+    with lock:
+        if cache != None:
+            cache.record(response.get('restored'))
+        filename = request.get('filename', '<input>') if type(request) == dict \
+            else '<invalid request>'
+        print('%s: exit status %d, %.2f ms' % (filename, response['ec'],
+            response['latency'] * 1000), file=sys.stderr)
+
+
+# Serve compilation requests on Unix socket 'socket_path' using 'jobs'
+# worker threads (0: one per CPU) until interrupted or terminated.
+def serve(socket_path, jobs, cache):
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        if os.path.exists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                perror_exit(1, socket_path + ': exists and is not a socket')
+            try:
+                server.connect(socket_path)
+                perror_exit(1, socket_path + ': compile server already running')
+            except ConnectionRefusedError: # Stale socket
+                os.remove(socket_path)
+            server.close()
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(socket_path)
+        server.listen(128)
+    except OSError as oserr:
+        perror_oserr(oserr)
+        sys.exit(oserr.errno)
+    print('Serving on %s with %d worker(s)' % (socket_path, jobs), file=sys.stderr)
 
-def optional_sign():
-    if token.tktype == TokenType.PLUS or token.tktype == TokenType.MINUS:
-        return add_oper()
+    executor = concurrent.futures.ThreadPoolExecutor(jobs)
+    lock = threading.Lock()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while True:
+            conn, addr = server.accept()
+            executor.submit(serve_connection, conn, cache, lock)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
+        executor.shutdown()
+
+
+# Compile program 'source' on the compile server listening on
+# 'socket_path'. Same interface as cached_compile().
+def remote_compile(socket_path, source, filename='<input>', lexer='fsm',
+        emit=default_emit, optlevel=0):
+    request = {'filename': filename, 'source': source, 'lexer': lexer,
+        'emit': emit, 'optlevel': optlevel}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError as oserr:
+            oserr.filename = socket_path
+            raise
+        sock.sendall(json.dumps(request).encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        try:
+            response = json.loads(recv_all(sock).decode('utf-8'))
+        except ValueError: # The server closed the connection without replying.
+            errfile = io.StringIO()
+            perror(socket_path + ': no valid response from compile server',
+                file=errfile)
+            raise CompileError(1, errfile.getvalue())
+    if response['ec'] != 0:
+        raise CompileError(response['ec'], response['diagnostics'])
+    return Artifacts(response['interm'], response['cequiv'], response['asm'],
+        response['diagnostics'], response['dot'], response['peephole']), \
+        response['restored']
 
 
 ##############################################################
@@ -1750,13 +3594,28 @@ def optional_sign():
 # Print program usage and exit.
 def print_usage(ec=0):
     print('Usage:  %s [OPTIONS] {-i|--input} INFILE' % __file__)
+    print('        %s [OPTIONS] [-j N] INFILE|DIR...' % __file__)
     print('Available options:')
     print('        -h, --help                Display this information')
     print('        -v, --version             Output version information')
     print('        -I, --interm              Keep intermediate code (IC) file')
     print('        -C, --c-equiv             Keep IC equivalent in C lang file')
     print('        --save-temps              Equivalent to -IC option')
-    print('        -o, --output OUTFILE      Place output in file: OUTFILE\n')
+    print('        --emit=LIST               Emit the artifacts of comma separated LIST:')
+    print('                                  asm, int, c, dot (default: asm, int, c, or')
+    print('                                  asm and the ones kept by -I, -C)')
+    print('        --lexer=fsm|table         Select lexical analyzer engine (default: fsm)')
+    print('        -O LEVEL                  Optimization level: 0 (default), 1 or 2')
+    print('        -j, --jobs N              Compile N files in parallel (0: one per CPU)')
+    print('        --cache-dir=DIR           Cache compiled programs in directory DIR')
+    print('        --cache-size=N            Limit cache size to N MiB (default: 100)')
+    print('        --cache-stats             Print cache hits, misses and bytes saved')
+    print('        --peephole-stats          Print peephole optimization rule hits')
+    print('        --serve=SOCKET            Run a compile server on Unix socket SOCKET')
+    print('        --connect=SOCKET          Compile using the server on Unix socket SOCKET')
+    print('        -o, --output OUTFILE      Place output in file: OUTFILE (\'-\': stdout)\n')
+    print('Every \'.csc\' file found under a DIR is compiled. Output file names')
+    print('are derived from each input file name when more than one file is given.\n')
     sys.exit(ec)
 
 
@@ -1769,22 +3628,196 @@ def print_version():
     sys.exit()
 
 
-# Implements the command line interface and triggers the
-# different stages of the compilation process.
+# Compile CiScal program 'source' and return an Artifacts object.
+# Raise CompileError on failure. This is the library interface of the
+# compiler; it can be called any number of times, from any thread.
+def compile(source, filename='<input>', lexer='fsm', emit=default_emit, optlevel=0):
+    return Compiler(source, filename, lexer, emit, optlevel).run()
+
+
+# Print an OSError to stderr (or 'file').
+def perror_oserr(oserr, file=None):
+    if file == None:
+        file = sys.stderr
+    if oserr.filename != None:
+        perror(oserr.filename + ':', oserr.strerror, file=file)
+    else:
+        perror(oserr, file=file)
+
+
+# Print an internal compiler error: unexpected exception 'exc', raised
+# while compiling 'filename', along with its traceback, to stderr (or
+# 'file').
+def perror_internal(exc, filename, file=None):
+    if file == None:
+        file = sys.stderr
+    perror(filename + ': internal compiler error', file=file)
+    file.write(''.join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+
+
+# Return the intermediate code, C equivalent, control flow graph and
+# assembly code file names of 'input_filename'. The latter is
+# 'output_filename', if given.
+def output_filenames(input_filename, output_filename=''):
+    if output_filename == '':
+        output_filename = input_filename[:-4] + '.asm'
+    return input_filename[:-4] + '.int', input_filename[:-4] + '.c', \
+        input_filename[:-4] + '.dot', output_filename
+
+
+# Compile file 'input_filename' and write the output files of the
+# artifacts in 'emit'; the assembly code file is 'output_filename', if
+# given ('-': stdout). If 'cache' is a CompileCache object, the artifacts
+# are looked up there first. If 'server' is given, the program is
+# compiled by the compile server listening on that socket instead.
+# Return an (input_filename, exit code, diagnostics, restored, peephole)
+# tuple, where 'restored' is the number of bytes restored from the cache
+# or None and 'peephole' the dictionary of the hits of every peephole
+# optimization rule (empty on failure). It never exits, so it can also
+# be used by batch mode workers; an unexpected exception is reported as
+# an internal compiler error of this file alone.
+def compile_file(input_filename, output_filename='', lexer='fsm', emit=default_emit,
+        optlevel=0, cache=None, server=None):
+    errfile = io.StringIO()
+    interm_filename, cequiv_filename, dot_filename, output_filename = \
+        output_filenames(input_filename, output_filename)
+    restored = None
+    try:
+        with open(input_filename, 'r', encoding='utf-8') as f:
+            source = f.read()
+        if output_filename != '-' and os.path.isfile(output_filename):
+            pwarn(output_filename + ': exists and will be overwritten!', file=errfile)
+        try:
+            if server != None:
+                artifacts, restored = remote_compile(server, source, input_filename,
+                    lexer, emit, optlevel)
+            else:
+                artifacts, restored = cached_compile(source, input_filename, lexer,
+                    emit, optlevel, cache)
+        except CompileError as err:
+            return input_filename, err.ec, errfile.getvalue() + err.diagnostics, None, \
+                dict()
+        errfile.write(artifacts.diagnostics)
+        for filename, text in ((interm_filename, artifacts.interm),
+                (cequiv_filename, artifacts.cequiv), (dot_filename, artifacts.dot),
+                (output_filename, artifacts.asm)):
+            if text == None:
+                continue
+            if filename == '-':
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                continue
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(text)
+    except OSError as oserr:
+        perror_oserr(oserr, file=errfile)
+        return input_filename, oserr.errno, errfile.getvalue(), restored, dict()
+    except Exception as exc:
+        perror_internal(exc, input_filename, file=errfile)
+        return input_filename, 1, errfile.getvalue(), restored, dict()
+    return input_filename, 0, errfile.getvalue(), restored, artifacts.peephole
+
+
+# Return the list of files to compile in batch mode: every file of
+# 'paths', along with every '.csc' file found under its directories.
+def batch_inputs(paths):
+    inputs = list()
+    for path in paths:
+        if not os.path.isdir(path):
+            if path[-4:] != '.csc':
+                perror(path + ': invalid file type')
+                perror_exit(1, 'INFILE should have a \'.csc\' extension')
+            inputs.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename[-4:] == '.csc':
+                    inputs.append(os.path.join(dirpath, filename))
+    return inputs
+
+
+# Compile every file of 'inputs' using 'jobs' worker processes. Report
+# the diagnostics of each file (in input order) followed by a summary;
+# return 1 if any of the files failed to compile, 0 otherwise. The hits
+# of the peephole optimization rules are added to dictionary 'peephole'.
+def compile_batch(inputs, jobs, lexer, emit=default_emit, optlevel=0, cache=None,
+        server=None, peephole=None):
+    compile_input = functools.partial(compile_file, lexer=lexer, emit=emit,
+        optlevel=optlevel, cache=cache, server=server)
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(inputs))
+    if jobs > 1:
+        chunksize = max(1, len(inputs) // (jobs * 4))
+        executor = concurrent.futures.ProcessPoolExecutor(jobs)
+        results  = executor.map(compile_input, inputs, chunksize=chunksize)
+    else:
+        executor = None
+        results  = map(compile_input, inputs)
+
+    failed = list()
+    for input_filename, ec, diagnostics, restored, hits in results:
+        if cache != None:
+            cache.record(restored)
+        if peephole != None:
+            add_peephole_hits(peephole, hits)
+        if diagnostics != '':
+            print(clr.BLD + input_filename + ':' + clr.END, file=sys.stderr)
+            sys.stderr.write(diagnostics)
+        if ec != 0:
+            failed.append((input_filename, ec))
+    if executor != None:
+        executor.shutdown()
+
+    print('%d file(s): %d compiled, %d failed' %
+        (len(inputs), len(inputs) - len(failed), len(failed)))
+    for input_filename, ec in failed:
+        print('  %s: exit status %d' % (input_filename, ec))
+    return 1 if failed else 0
+
+
+# Add the peephole optimization rule hits of dictionary 'hits' to the
+# ones of dictionary 'total'.
+def add_peephole_hits(total, hits):
+    for name, count in hits.items():
+        total[name] = total.get(name, 0) + count
+
+
+# Print the peephole optimization rule hits of dictionary 'hits', most
+# frequent first.
+def print_peephole_hits(hits):
+    print('peephole: ' + ', '.join('%s: %d hit(s)' % (name, hits[name])
+        for name in sorted(hits, key=hits.get, reverse=True)))
+
+
+# Implements the command line interface on top of compile().
 def main(argv):
-    input_filename  = ''
-    interm_filename = ''
-    cequiv_filename = ''
+    lexer           = 'fsm'
+    jobs            = -1   # -1: not given
+    cache_dir       = ''
+    cache_size      = 100  # MiB
+    cache_stats     = False
+    peephole        = None # Peephole optimization rule hits (--peephole-stats)
+    optlevel        = 0
+    emit            = None # Artifacts of --emit
+    keep            = list() # Artifacts of -I and -C
+    serve_socket    = ''
+    server          = None # Compile server socket (client mode)
+    input_filenames = list()
     output_filename = ''
 
     try:
-        opts, args = getopt.getopt(argv,"hvICo::i:",["help", "version", "interm",
-                                    "c-equiv", "save-temps", "input=", "output="])
+        opts, args = getopt.getopt(argv,"hvICo::i:j:O:",["help", "version", "interm",
+                                    "c-equiv", "save-temps", "input=", "output=",
+                                    "lexer=", "jobs=", "cache-dir=", "cache-size=",
+                                    "cache-stats", "serve=", "connect=", "emit=",
+                                    "peephole-stats"])
     except getopt.GetoptError as err:
         perror(err)
         print_usage(1)
 
-    if not opts:
+    if not opts and not args:
         print_usage(1)
 
     for opt, arg in opts:
@@ -1793,32 +3826,104 @@ def main(argv):
         elif opt in ("-v", "--version"):
             print_version()
         elif opt in ("-i", "--input"):
-            input_filename = arg
+            input_filenames.append(arg)
         elif opt in ("-o", "--output"):
             output_filename = arg
-        elif opt in ("-I", "--interm", "-C", "--c-equiv", "--save-temps"):
-            pwarn("%s: Enabled by default option" % opt)
-
-    if input_filename == '':
+        elif opt in ("-I", "--interm"):
+            keep.append('int')
+        elif opt in ("-C", "--c-equiv"):
+            keep.append('c')
+        elif opt == "--save-temps":
+            keep += ['int', 'c']
+        elif opt == "-O":
+            if not arg.isdigit() or int(arg) not in optlevels:
+                perror('%s: unknown optimization level' % arg)
+                print_usage(1)
+            optlevel = int(arg)
+        elif opt == "--emit":
+            emit = arg.split(',')
+            for kind in emit:
+                if kind not in artifact_kinds:
+                    perror('%s: unknown artifact' % kind)
+                    print_usage(1)
+        elif opt == "--lexer":
+            if arg not in ('fsm', 'table'):
+                perror('%s: unknown lexical analyzer engine' % arg)
+                print_usage(1)
+            lexer = arg
+        elif opt in ("-j", "--jobs"):
+            if not arg.isdigit():
+                perror('%s: invalid number of jobs' % arg)
+                print_usage(1)
+            jobs = int(arg)
+        elif opt == "--cache-dir":
+            cache_dir = arg
+        elif opt == "--cache-size":
+            if not arg.isdigit():
+                perror('%s: invalid cache size' % arg)
+                print_usage(1)
+            cache_size = int(arg)
+        elif opt == "--cache-stats":
+            cache_stats = True
+        elif opt == "--peephole-stats":
+            peephole = dict()
+        elif opt == "--serve":
+            serve_socket = arg
+        elif opt == "--connect":
+            server = arg
+    input_filenames += args
+
+    # Without --emit, -I and -C select the artifacts to keep along with
+    # the final code; without any of them, the default artifacts are
+    # emitted.
+    if emit == None:
+        emit = ['asm'] if keep else default_emit
+    emit = tuple(kind for kind in artifact_kinds if kind in emit or kind in keep)
+
+    cache = None
+    if cache_dir != '':
+        cache = CompileCache(cache_dir, cache_size * 2**20)
+    elif cache_stats:
+        perror_exit(1, 'Option --cache-stats requires option --cache-dir')
+    if peephole != None and optlevel < 1:
+        perror_exit(1, 'Option --peephole-stats requires option -O1 or higher')
+
+    if serve_socket != '':
+        serve(serve_socket, 0 if jobs == -1 else jobs, cache)
+        ec = 0
+    elif not input_filenames:
         perror('Option {-i|--input} is required')
         print_usage(1)
-    elif input_filename[-4:] != '.csc':
-        perror(input_filename + ': invalid file type')
-        perror_exit(1, 'INFILE should have a \'.csc\' extension')
-
-    interm_filename = input_filename[:-4] + '.int'
-    cequiv_filename = input_filename[:-4] + '.c'
-    if output_filename == '':
-        output_filename = input_filename[:-4] + '.asm'
-
-    if os.path.isfile(output_filename):
-        pwarn(output_filename + ': exists and will be overwritten!')
-
-    open_files(input_filename, interm_filename, cequiv_filename, output_filename)
-    parser()
-    close_files()
+    elif len(input_filenames) > 1 or jobs != -1 or os.path.isdir(input_filenames[0]):
+        if output_filename != '':
+            perror_exit(1, 'Option {-o|--output} cannot be used in batch mode')
+        inputs = batch_inputs(input_filenames)
+        if not inputs:
+            perror_exit(1, 'No \'.csc\' files to compile')
+        ec = compile_batch(inputs, 1 if jobs == -1 else jobs, lexer, emit, optlevel,
+            cache, server, peephole)
+    else:
+        input_filename = input_filenames[0]
+        if input_filename[-4:] != '.csc':
+            perror(input_filename + ': invalid file type')
+            perror_exit(1, 'INFILE should have a \'.csc\' extension')
+        input_filename, ec, diagnostics, restored, hits = \
+            compile_file(input_filename, output_filename, lexer, emit, optlevel,
+                cache, server)
+        sys.stderr.write(diagnostics)
+        if cache != None:
+            cache.record(restored)
+        if peephole != None:
+            add_peephole_hits(peephole, hits)
+
+    if cache != None:
+        cache.evict()
+        if cache_stats:
+            cache.print_stats()
+    if peephole != None:
+        print_peephole_hits(peephole)
+    sys.exit(ec)
 
 
 if __name__ == "__main__":
     main(sys.argv[1:])
-
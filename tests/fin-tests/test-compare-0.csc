@@ -0,0 +1,42 @@
+\* test-compare-0.csc
+ * Comparisons against constants, which are compiled into branches
+ * against $zero and slti at -O1 and above. x <= C and x > C become
+ * x < C + 1 and its negation, unless C + 1 is out of the range of
+ * immediates (C = 32767).
+ * Expected output, one line per call of 'show':
+ *   1 0 1 0 1 0 1 0 0 1 0 1 1
+ *   1 0 1 0 1 0 1 0 0 1 0 1 0
+ *   1 0 1 0 0 1 1 0 1 0 0 1 0
+ *   1 0 1 0 0 1 0 1 0 1 1 1 0
+ *   1 0 1 0 0 1 0 1 0 1 1 0 0
+ *   1 0 0 1 0 1 0 1 0 1 1 0 0
+ *\
+
+program myProg {
+	declare
+		x
+	enddeclare
+
+	procedure show(in a) {
+		if (a <= 32767) print(1); else print(0);;
+		if (a > 32767) print(1); else print(0);;
+		if (a <= 32766) print(1); else print(0);;
+		if (a > 32766) print(1); else print(0);;
+		if (a < 0) print(1); else print(0);;
+		if (a >= 0) print(1); else print(0);;
+		if (a <= 0) print(1); else print(0);;
+		if (a > 0) print(1); else print(0);;
+		if (a = 0) print(1); else print(0);;
+		if (a <> 0) print(1); else print(0);;
+		if (0 < a) print(1); else print(0);;
+		if (5 >= a) print(1); else print(0);;
+		if (a < -32766) print(1); else print(0);;
+	}
+
+	call show(in -32767);
+	call show(in -1);
+	call show(in 0);
+	call show(in 1);
+	call show(in 32766);
+	call show(in 32767);
+}
@@ -0,0 +1,33 @@
+\* test-shift-0.csc
+ * Multiplication and division by powers of 2, which are compiled
+ * into shifts at -O1 and above. Division truncates towards zero.
+ * Expected output, one line per call of 'show':
+ *   -4 -2 -1 -9 -18 -72 -36 -9
+ *   -4 -2 -1 -8 -16 -64 -32 -8
+ *   0 0 0 -1 -2 -8 -4 -1
+ *   3 1 0 7 14 56 28 7
+ *   2047 1023 511 4095 8190 32760 16380 4095
+ *\
+
+program myProg {
+	declare
+		x
+	enddeclare
+
+	procedure show(in a) {
+		print(a / 2);
+		print(a / 4);
+		print(a / 8);
+		print(a / 1);
+		print(a * 2);
+		print(a * 8);
+		print(4 * a);
+		print(a * 1);
+	}
+
+	call show(in -9);
+	call show(in -8);
+	call show(in -1);
+	call show(in 7);
+	call show(in 4095);
+}
@@ -0,0 +1,23 @@
+\* test-cse-0.csc
+ * Repeated subexpressions in a loop, around a call that modifies one
+ * of their operands.
+ * Expected output: 187857 1519004
+ *\
+
+program cse {
+	declare a, b, c, d, i enddeclare
+	procedure p(inout x) {
+		x := x + 1
+	}
+	a := 3; b := 4; i := 0;
+	while (i < 50) {
+		c := a * b + a * b;
+		d := (a + b) * (b + a) - a * b;
+		call p(inout a);
+		d := d + a * b;
+		b := b + i;
+		c := c + a * b;
+		i := i + 1
+	};
+	print(c); print(d)
+}
@@ -0,0 +1,30 @@
+\* test-leaf-0.csc
+ * Calls of leaf functions and procedures in a loop.
+ * Expected output: 7 338650 100
+ *\
+
+program leaf {
+	declare i, s, t enddeclare
+	function sq(in x) {
+		return (x * x)
+	}
+	function add3(in a, in b, inout c) {
+		c := c + 1;
+		return (a + b + c)
+	}
+	procedure bump(inout v) {
+		v := v + 1
+	}
+	procedure tick() {
+		print(7)
+	}
+	i := 0; s := 0; t := 0;
+	while (i < 100) {
+		s := s + sq(in i);
+		s := s + add3(in i, in 2, inout t);
+		call bump(inout s);
+		i := i + 1
+	};
+	call tick();
+	print(s); print(t)
+}
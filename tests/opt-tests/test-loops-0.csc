@@ -0,0 +1,24 @@
+\* test-loops-0.csc
+ * Nested while loops followed by a do-while loop.
+ * Expected output: 222650
+ *\
+
+program loops {
+	declare i, j, s, n enddeclare
+	n := 100;
+	s := 0;
+	i := 0;
+	while (i < n) {
+		j := 0;
+		while (j < 10) {
+			s := s + i * j;
+			j := j + 1
+		};
+		i := i + 1
+	};
+	do {
+		s := s - 1;
+		i := i - 1
+	} while (i > 0 and s > 0);
+	print(s)
+}
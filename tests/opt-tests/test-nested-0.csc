@@ -0,0 +1,43 @@
+\* test-nested-0.csc
+ * Variables of enclosing blocks referred to from loops in nested
+ * procedures.
+ * Expected output: 5477 359
+ *\
+
+program deep {
+	declare g, n enddeclare
+	procedure p1(in a) {
+		declare x enddeclare
+		procedure p2(in b) {
+			declare y enddeclare
+			procedure p3(in c) {
+				declare i, s enddeclare
+				procedure p4(inout d) {
+					declare k enddeclare
+					k := 0;
+					while (k < 3) {
+						d := d + x + y + a + b + k;
+						k := k + 1
+					};
+					if (d < 200) call p4(inout d);
+				}
+				i := 0; s := 0;
+				while (i < 50) {
+					s := s + x * y + a - b + c;
+					x := x + 1;
+					i := i + 1
+				};
+				call p4(inout s);
+				call p4(inout g);
+				print(s)
+			}
+			y := b * 2;
+			call p3(in y + 1)
+		}
+		x := a;
+		call p2(in a + 1)
+	}
+	g := 5; n := 0;
+	call p1(in 1);
+	print(g)
+}
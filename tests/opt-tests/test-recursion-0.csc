@@ -0,0 +1,23 @@
+\* test-recursion-0.csc
+ * Recursive functions: fib(15) and 7!.
+ * Expected output: 610 5040
+ *\
+
+program rec {
+	declare n, r enddeclare
+	function fib(in k) {
+		declare a, b enddeclare
+		if (k < 2) return (k);;
+		a := fib(in k - 1);
+		b := fib(in k - 2);
+		return (a + b)
+	}
+	function fact(in k) {
+		if (k <= 1) return (1); else return (k * fact(in k - 1));;
+		return (0)
+	}
+	n := 15;
+	r := fib(in n);
+	print(r);
+	print(fact(in 7))
+}